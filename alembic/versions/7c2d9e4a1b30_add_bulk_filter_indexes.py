@@ -0,0 +1,43 @@
+"""add_bulk_filter_indexes
+
+Revision ID: 7c2d9e4a1b30
+Revises: 395e1c1eb9d0
+Create Date: 2026-10-16 09:12:41.208315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2d9e4a1b30'
+down_revision: Union[str, Sequence[str], None] = '395e1c1eb9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Indeks częściowy - tylko aktywne, niezablokowane ceny (jak w build_filter_query)
+    op.create_index(
+        'ix_base_prices_active_hot',
+        'base_prices',
+        ['material_id', 'surface_finish', 'thickness', 'width', 'price_pln_per_kg'],
+        unique=False,
+        postgresql_where=sa.text('is_active AND price_pln_per_kg > 0'),
+        sqlite_where=sa.text('is_active = 1 AND price_pln_per_kg > 0'),
+    )
+    op.create_index(
+        'ix_materials_cat_group_grade',
+        'materials',
+        ['category', 'group_id', 'grade'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_materials_cat_group_grade', table_name='materials')
+    op.drop_index('ix_base_prices_active_hot', table_name='base_prices')
@@ -0,0 +1,35 @@
+"""add_grinding_lookup_index
+
+Revision ID: a6c1d4e8b205
+Revises: f02b6d8e4a91
+Create Date: 2026-10-16 15:07:19.482031
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c1d4e8b205'
+down_revision: Union[str, Sequence[str], None] = 'f02b6d8e4a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Wyszukiwanie dostępności szlifu (get_available_providers,
+    # is_grinding_available, update_grinding_price)
+    op.create_index(
+        'ix_grinding_lookup',
+        'grinding_prices',
+        ['thickness', 'provider', 'grit', 'with_sb', 'width_variant', 'is_active'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_grinding_lookup', table_name='grinding_prices')
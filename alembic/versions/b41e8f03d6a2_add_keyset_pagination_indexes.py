@@ -0,0 +1,30 @@
+"""add_keyset_pagination_indexes
+
+Revision ID: b41e8f03d6a2
+Revises: 7c2d9e4a1b30
+Create Date: 2026-10-16 10:03:17.552904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e8f03d6a2'
+down_revision: Union[str, Sequence[str], None] = '7c2d9e4a1b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+    op.create_index('ix_api_keys_created_at_id', 'api_keys', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_api_keys_created_at_id', table_name='api_keys')
+    op.drop_index('ix_users_created_at_id', table_name='users')
@@ -0,0 +1,34 @@
+"""add_film_price_lookup_index
+
+Revision ID: c3e7a9f1b482
+Revises: a6c1d4e8b205
+Create Date: 2026-10-16 18:42:05.913274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e7a9f1b482'
+down_revision: Union[str, Sequence[str], None] = 'a6c1d4e8b205'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Wyszukiwanie ceny folii (PricingService.get_film_price)
+    op.create_index(
+        'ix_film_price_lookup',
+        'film_prices',
+        ['film_type', 'thickness', 'is_active'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_film_price_lookup', table_name='film_prices')
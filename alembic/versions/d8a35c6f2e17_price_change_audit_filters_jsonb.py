@@ -0,0 +1,43 @@
+"""price_change_audit_filters_jsonb
+
+Revision ID: d8a35c6f2e17
+Revises: b41e8f03d6a2
+Create Date: 2026-10-16 10:41:52.118620
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a35c6f2e17'
+down_revision: Union[str, Sequence[str], None] = 'b41e8f03d6a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tylko PostgreSQL - na SQLite model używa zwykłego JSON, kolumna bez zmian
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # Istniejące wpisy to poprawny JSON zapisany jako tekst
+    op.alter_column('price_change_audits', 'filters_json',
+               existing_type=sa.Text(),
+               type_=postgresql.JSONB(),
+               existing_nullable=True,
+               postgresql_using='filters_json::jsonb')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.alter_column('price_change_audits', 'filters_json',
+               existing_type=postgresql.JSONB(),
+               type_=sa.Text(),
+               existing_nullable=True,
+               postgresql_using='filters_json::text')
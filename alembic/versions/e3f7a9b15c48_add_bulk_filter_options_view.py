@@ -0,0 +1,55 @@
+"""add_bulk_filter_options_view
+
+Revision ID: e3f7a9b15c48
+Revises: d8a35c6f2e17
+Create Date: 2026-10-16 11:26:08.473291
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3f7a9b15c48'
+down_revision: Union[str, Sequence[str], None] = 'd8a35c6f2e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Widok zmaterializowany istnieje tylko w PostgreSQL - na innych bazach
+    # opcje filtrów liczone są zapytaniem (has_filter_options_view)
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # Kombinacje wartości filtrów zmian zbiorczych (odświeżane po każdym commit
+    # zmieniającym base_prices/materials - patrz services/bulk_pricing.py)
+    op.execute("""
+        CREATE MATERIALIZED VIEW mv_bulk_filter_options AS
+        SELECT
+            m.category,
+            m.group_id,
+            m.grade,
+            bp.surface_finish,
+            bp.width,
+            MIN(bp.thickness) AS thickness_min,
+            MAX(bp.thickness) AS thickness_max
+        FROM base_prices bp
+        JOIN materials m ON m.id = bp.material_id
+        WHERE bp.is_active AND bp.price_pln_per_kg > 0
+        GROUP BY m.category, m.group_id, m.grade, bp.surface_finish, bp.width
+    """)
+    # Unikalny indeks jest wymagany przez REFRESH ... CONCURRENTLY
+    op.execute("""
+        CREATE UNIQUE INDEX ux_mv_bulk_filter_options
+        ON mv_bulk_filter_options (category, group_id, grade, surface_finish, width)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS mv_bulk_filter_options")
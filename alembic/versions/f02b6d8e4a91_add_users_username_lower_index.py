@@ -0,0 +1,33 @@
+"""add_users_username_lower_index
+
+Revision ID: f02b6d8e4a91
+Revises: e3f7a9b15c48
+Create Date: 2026-10-16 12:02:35.860177
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f02b6d8e4a91'
+down_revision: Union[str, Sequence[str], None] = 'e3f7a9b15c48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_users_username_lower',
+        'users',
+        [sa.text('lower(username)')],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_username_lower', table_name='users')
@@ -25,7 +25,7 @@ async def get_optional_user(
     if not user_id:
         return None
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
 
     if not user or not user.is_active:
         return None
@@ -48,7 +48,7 @@ async def get_current_user(
     if not user_id:
         raise HTTPException(status_code=401, detail="Nie zalogowany")
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
 
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="Nieprawidlowa sesja")
@@ -75,7 +75,7 @@ async def require_admin(
             headers={"Location": "/login"},
         )
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
 
     if not user or not user.is_active:
         raise HTTPException(
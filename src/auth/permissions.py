@@ -36,7 +36,7 @@ def require_role(allowed_roles: List[UserRole]):
         if not user_id:
             raise HTTPException(status_code=401, detail="Nie zalogowany")
 
-        user = db.query(User).filter(User.id == user_id).first()
+        user = db.get(User, user_id)
 
         if not user or not user.is_active:
             raise HTTPException(status_code=401, detail="Nieprawidłowa sesja")
@@ -66,7 +66,12 @@ require_viewer = require_role([UserRole.ADMIN, UserRole.EDITOR, UserRole.VIEWER]
 # ============== API KEY AUTH ==============
 
 def hash_api_key(key: str) -> str:
-    """Hash klucza API (SHA256)."""
+    """Hash klucza API (SHA256).
+
+    Klucze są losowe (256 bitów), więc wystarcza szybki hash bez KDF.
+    hashlib korzysta z OpenSSL (SHA-NI na nowszych CPU). Zmiana algorytmu
+    unieważniłaby wszystkie zapisane klucze (ApiKey.key_hash).
+    """
     return hashlib.sha256(key.encode()).hexdigest()
 
 
@@ -102,7 +107,7 @@ async def get_api_key_user(
     db.commit()
 
     # Pobierz użytkownika
-    user = db.query(User).filter(User.id == api_key.user_id).first()
+    user = db.get(User, api_key.user_id)
 
     if not user or not user.is_active:
         return None
@@ -184,7 +189,7 @@ async def get_current_user_or_api(
     if not user_id:
         raise HTTPException(status_code=401, detail="Nie zalogowany")
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
 
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="Nieprawidłowa sesja")
@@ -3,7 +3,7 @@
 from enum import Enum
 from typing import Optional, TYPE_CHECKING
 
-from sqlalchemy import String, Float, Enum as SQLEnum, Boolean, ForeignKey, Text
+from sqlalchemy import String, Float, Enum as SQLEnum, Boolean, ForeignKey, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..database import Base
@@ -126,6 +126,11 @@ class Material(Base):
         back_populates="material", cascade="all, delete-orphan"
     )
 
+    # Indeks pod filtry zmian zbiorczych (kategoria -> grupa -> gatunek)
+    __table_args__ = (
+        Index('ix_materials_cat_group_grade', 'category', 'group_id', 'grade'),
+    )
+
     def __repr__(self) -> str:
         return f"<Material {self.grade} ({self.category.value})>"
 
@@ -5,8 +5,9 @@ from typing import Optional, TYPE_CHECKING
 
 from sqlalchemy import (
     String, Float, Integer, ForeignKey, DateTime, Boolean,
-    UniqueConstraint, Text
+    UniqueConstraint, Text, Index, JSON, text
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..database import Base
@@ -58,6 +59,13 @@ class BasePrice(Base):
             'material_id', 'surface_finish', 'thickness', 'width', 'valid_from',
             name='uq_base_price'
         ),
+        # Indeks częściowy pod filtry zmian zbiorczych (tylko aktywne, niezablokowane ceny)
+        Index(
+            'ix_base_prices_active_hot',
+            'material_id', 'surface_finish', 'thickness', 'width', 'price_pln_per_kg',
+            postgresql_where=text('is_active AND price_pln_per_kg > 0'),
+            sqlite_where=text('is_active = 1 AND price_pln_per_kg > 0'),
+        ),
     )
 
     def __repr__(self) -> str:
@@ -147,8 +155,10 @@ class PriceChangeAudit(Base):
     # Typ zmiany: bulk_percentage, bulk_absolute
     change_type: Mapped[str] = mapped_column(String(50), index=True)
 
-    # Filtry użyte do zmiany (JSON)
-    filters_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Filtry użyte do zmiany (JSONB w PostgreSQL, serializacja po stronie SQLAlchemy)
+    filters_json: Mapped[Optional[dict]] = mapped_column(
+        JSON().with_variant(JSONB(), "postgresql"), nullable=True
+    )
 
     # Wartość zmiany (% lub PLN/kg)
     change_value: Mapped[float] = mapped_column(Float)
@@ -3,7 +3,7 @@
 from enum import Enum
 from typing import Optional
 
-from sqlalchemy import String, Float, Boolean, Enum as SQLEnum, UniqueConstraint
+from sqlalchemy import String, Float, Boolean, Enum as SQLEnum, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from ..database import Base
@@ -64,6 +64,12 @@ class GrindingPrice(Base):
             'provider', 'grit', 'thickness', 'width_variant', 'with_sb',
             name='uq_grinding_price'
         ),
+        # Indeks pod wyszukiwanie dostępności szlifu - każde z tych zapytań
+        # filtruje po grubości, nie każde po dostawcy
+        Index(
+            'ix_grinding_lookup',
+            'thickness', 'provider', 'grit', 'with_sb', 'width_variant', 'is_active',
+        ),
     )
 
     def is_available(self) -> bool:
@@ -113,6 +119,11 @@ class FilmPrice(Base):
     # Status
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
+    # Indeks pod wyszukiwanie ceny folii w kalkulacji (typ + grubość)
+    __table_args__ = (
+        Index('ix_film_price_lookup', 'film_type', 'thickness', 'is_active'),
+    )
+
     def __repr__(self) -> str:
         return (
             f"<FilmPrice {self.film_type.value} {self.thickness}mm "
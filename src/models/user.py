@@ -4,7 +4,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional, List
 
-from sqlalchemy import String, Boolean, DateTime, ForeignKey, Integer, Text
+from sqlalchemy import String, Boolean, DateTime, ForeignKey, Integer, Text, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..database import Base
@@ -54,6 +54,11 @@ class User(Base):
         "ApiKey", back_populates="user", cascade="all, delete-orphan"
     )
 
+    # Indeks pod paginację keyset (od najnowszych)
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
+
     @property
     def is_admin(self) -> bool:
         """Czy użytkownik ma rolę admin."""
@@ -75,6 +80,10 @@ class User(Base):
         return f"<User {self.username} ({self.role})>"
 
 
+# Unikalność loginu bez względu na wielkość liter (wyszukiwanie po lower(username))
+Index("ix_users_username_lower", func.lower(User.username), unique=True)
+
+
 class ApiKey(Base):
     """Klucze API dla integracji zewnętrznych."""
 
@@ -102,6 +111,11 @@ class ApiKey(Base):
     last_used: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
+    # Indeks pod paginację keyset (od najnowszych)
+    __table_args__ = (
+        Index("ix_api_keys_created_at_id", "created_at", "id"),
+    )
+
     @property
     def is_expired(self) -> bool:
         """Czy klucz wygasł."""
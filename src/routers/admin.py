@@ -1,12 +1,13 @@
 """Endpointy administracyjne - zarządzanie matrycami cen i materiałami."""
 
-from typing import Optional
+import codecs
+from typing import IO, Iterator, Optional
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, UploadFile, File
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
-from io import BytesIO
+from starlette.background import BackgroundTask
 
 from ..database import get_db
 from ..models import (
@@ -26,6 +27,9 @@ from ..models import (
 from ..models.price import BasePrice
 from ..auth.dependencies import get_current_user
 from ..services import GrindingValidationService, BulkPricingService, PriceExporter, ExcelImporter
+from ..services.bulk_pricing import refresh_filter_options_view
+from ..services.grinding_validation import invalidate_grinding_matrices
+from ..services.pricing import invalidate_price_lookups
 import tempfile
 import os
 import json
@@ -132,6 +136,8 @@ async def update_grinding_price(
 
     grinding_price.price_pln_per_kg = price
     db.commit()
+    invalidate_grinding_matrices(grinding_price.provider)
+    invalidate_price_lookups()
 
     return {
         "id": grinding_price.id,
@@ -269,6 +275,8 @@ async def initialize_costa_prices(
             blocked += 1
 
     db.commit()
+    invalidate_grinding_matrices(GrindingProvider.COSTA)
+    invalidate_price_lookups()
 
     return COSTAInitResponse(
         created=created,
@@ -323,6 +331,7 @@ async def update_film_price(
 
     film_price.price_pln_per_kg = price
     db.commit()
+    invalidate_price_lookups()
 
     return {
         "id": film_price.id,
@@ -358,6 +367,7 @@ async def update_film_matrix_bulk(
         count += 1
 
     db.commit()
+    invalidate_price_lookups()
 
     return {"updated": count}
 
@@ -458,6 +468,8 @@ async def add_grinding_row(
         created += 1
 
     db.commit()
+    invalidate_grinding_matrices(provider)
+    invalidate_price_lookups()
 
     return AddMatrixResponse(
         success=True,
@@ -519,6 +531,8 @@ async def add_grinding_column(
         created += 1
 
     db.commit()
+    invalidate_grinding_matrices(provider)
+    invalidate_price_lookups()
 
     suffix = " +SB" if request.with_sb else ""
     return AddMatrixResponse(
@@ -561,6 +575,7 @@ async def add_film_row(
         created += 1
 
     db.commit()
+    invalidate_price_lookups()
 
     return AddMatrixResponse(
         success=True,
@@ -761,6 +776,7 @@ async def create_material_admin(
 async def update_material_admin(
     material_id: int,
     data: MaterialUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -781,6 +797,7 @@ async def update_material_admin(
         setattr(material, field, value)
 
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
     db.refresh(material)
 
     return material
@@ -985,6 +1002,7 @@ async def get_base_price_matrix(
 
 @router.put("/base-prices/{price_id}")
 async def update_base_price(
+    background_tasks: BackgroundTasks,
     price_id: int,
     price: float = Query(..., ge=0, description="Cena PLN/kg"),
     db: Session = Depends(get_db),
@@ -998,6 +1016,7 @@ async def update_base_price(
 
     base_price.price_pln_per_kg = price
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
 
     return {
         "id": base_price.id,
@@ -1010,6 +1029,7 @@ async def update_base_price(
 @router.post("/base-prices", status_code=201)
 async def create_base_price(
     data: BasePriceUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -1031,6 +1051,7 @@ async def create_base_price(
         # Aktualizuj istniejącą
         existing.price_pln_per_kg = data.price
         db.commit()
+        background_tasks.add_task(refresh_filter_options_view, db.get_bind())
         return {
             "id": existing.id,
             "price": existing.price_pln_per_kg,
@@ -1048,6 +1069,7 @@ async def create_base_price(
     )
     db.add(base_price)
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
     db.refresh(base_price)
 
     return {
@@ -1059,6 +1081,7 @@ async def create_base_price(
 
 @router.post("/base-prices/add-surface-finish")
 async def add_surface_finish_to_matrix(
+    background_tasks: BackgroundTasks,
     surface_finish: str = Query(..., description="Nowa powierzchnia (np. 2B, BA)"),
     category: str = Query(..., description="Kategoria materiału"),
     thickness: float = Query(..., description="Grubość"),
@@ -1102,6 +1125,7 @@ async def add_surface_finish_to_matrix(
         created += 1
 
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
 
     return {
         "message": f"Dodano powierzchnię '{surface_finish}'",
@@ -1112,6 +1136,7 @@ async def add_surface_finish_to_matrix(
 
 @router.post("/base-prices/add-thickness")
 async def add_thickness_to_matrix(
+    background_tasks: BackgroundTasks,
     new_thickness: float = Query(..., alias="thickness", description="Nowa grubość"),
     category: str = Query(..., description="Kategoria materiału"),
     width: float = Query(..., description="Szerokość"),
@@ -1164,6 +1189,7 @@ async def add_thickness_to_matrix(
             created += 1
 
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
 
     return {
         "message": f"Dodano grubość {new_thickness}mm",
@@ -1174,6 +1200,7 @@ async def add_thickness_to_matrix(
 
 @router.post("/base-prices/add-width")
 async def add_width_to_matrix(
+    background_tasks: BackgroundTasks,
     new_width: float = Query(..., alias="width", description="Nowa szerokość"),
     category: str = Query(..., description="Kategoria materiału"),
     thickness: float = Query(..., description="Grubość"),
@@ -1226,6 +1253,7 @@ async def add_width_to_matrix(
             created += 1
 
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
 
     return {
         "message": f"Dodano szerokość {new_width}mm",
@@ -1237,6 +1265,7 @@ async def add_width_to_matrix(
 @router.put("/base-prices/bulk", response_model=BasePriceBulkUpdateResponse)
 async def update_base_prices_bulk(
     request: BasePriceBulkUpdateRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -1268,6 +1297,7 @@ async def update_base_prices_bulk(
             created += 1
 
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
 
     return BasePriceBulkUpdateResponse(updated=updated, created=created)
 
@@ -1382,6 +1412,7 @@ async def preview_bulk_price_change(
 @router.post("/base-prices/bulk-change/apply", response_model=BulkPriceChangeResponse)
 async def apply_bulk_price_change(
     request: BulkPriceChangeRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -1391,13 +1422,15 @@ async def apply_bulk_price_change(
     Tworzy wpis w historii zmian (audit log).
     """
     service = BulkPricingService(db)
-    return service.apply_changes(
+    result = service.apply_changes(
         filters=request.filters,
         change_type=request.change_type,
         change_value=request.change_value,
         user=current_user,
         round_to=request.round_to,
     )
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
+    return result
 
 
 @router.get("/base-prices/audit-history")
@@ -1419,6 +1452,19 @@ async def get_price_audit_history(
 
 # === Export Endpoints ===
 
+# Rozmiar fragmentu pliku eksportu wysyłanego w odpowiedzi
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _file_chunks(content: IO[bytes]) -> Iterator[bytes]:
+    """Plik eksportu w fragmentach stałej wielkości.
+
+    Iteracja po pliku binarnym zwraca "linie" - dla xlsx (zip) to dowolnie
+    małe kawałki, każdy wysyłany osobno przez threadpool.
+    """
+    return iter(lambda: content.read(EXPORT_CHUNK_SIZE), b"")
+
+
 @router.get("/export/base-prices")
 async def export_base_prices(
     format: str = Query("xlsx", description="Format eksportu: xlsx lub csv"),
@@ -1440,7 +1486,8 @@ async def export_base_prices(
     surface_list = [s.strip() for s in surface_finishes.split(",")] if surface_finishes else None
 
     if format == "csv":
-        content = exporter.export_base_prices_csv(
+        # CSV wysylany fragmentami w miare pobierania wierszy z bazy
+        content = exporter.iter_base_prices_csv(
             categories=categories_list,
             thickness_min=thickness_min,
             thickness_max=thickness_max,
@@ -1449,7 +1496,7 @@ async def export_base_prices(
         )
         filename = exporter.get_export_filename("base_prices", "csv")
         return StreamingResponse(
-            BytesIO(content.encode("utf-8-sig")),
+            codecs.iterencode(content, "utf-8-sig"),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename={filename}"},
         )
@@ -1465,9 +1512,10 @@ async def export_base_prices(
         )
         filename = exporter.get_export_filename("base_prices", "xlsx")
         return StreamingResponse(
-            BytesIO(content),
+            _file_chunks(content),
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={"Content-Disposition": f"attachment; filename={filename}"},
+            background=BackgroundTask(content.close),
         )
 
 
@@ -1495,9 +1543,10 @@ async def export_grinding_prices(
 
     filename = exporter.get_export_filename("grinding", "xlsx")
     return StreamingResponse(
-        BytesIO(content),
+        _file_chunks(content),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
+        background=BackgroundTask(content.close),
     )
 
 
@@ -1525,9 +1574,10 @@ async def export_film_prices(
 
     filename = exporter.get_export_filename("film", "xlsx")
     return StreamingResponse(
-        BytesIO(content),
+        _file_chunks(content),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
+        background=BackgroundTask(content.close),
     )
 
 
@@ -1543,9 +1593,10 @@ async def export_modifiers(
 
     filename = exporter.get_export_filename("modifiers", "xlsx")
     return StreamingResponse(
-        BytesIO(content),
+        _file_chunks(content),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
+        background=BackgroundTask(content.close),
     )
 
 
@@ -1575,9 +1626,10 @@ async def export_all_prices(
 
     filename = exporter.get_export_filename("all", "xlsx")
     return StreamingResponse(
-        BytesIO(content),
+        _file_chunks(content),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
+        background=BackgroundTask(content.close),
     )
 
 
@@ -1726,6 +1778,7 @@ async def get_import_preview(
 async def apply_import(
     import_id: str,
     request: ImportApplyRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -1761,6 +1814,7 @@ async def apply_import(
     )
     db.add(audit)
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
 
     # Usun z cache
     del _import_cache[import_id]
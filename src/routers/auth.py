@@ -17,6 +17,8 @@ from ..auth.dependencies import get_current_user
 from ..auth.permissions import require_role
 from ..schemas.user import (
     UserCreate,
+    UserBulkCreate,
+    UserBulkCreateResponse,
     UserUpdate,
     UserPasswordChange,
     UserPasswordReset,
@@ -204,15 +206,18 @@ async def api_change_password(
 
 @router.get("/api/admin/users", response_model=UserListResponse)
 async def list_users(
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Rozmiar strony"),
+    before_id: Optional[int] = Query(None, description="Kursor - ID ostatniego użytkownika z poprzedniej strony"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role([UserRole.ADMIN])),
 ):
-    """Lista wszystkich użytkowników (tylko admin)."""
+    """Lista użytkowników (tylko admin)."""
     auth = AuthService(db)
-    users = auth.list_users()
+    users = auth.list_users(limit=limit, before_id=before_id)
     return UserListResponse(
         users=[UserResponse.model_validate(u) for u in users],
-        total=len(users),
+        total=auth.count_users(),
+        next_before_id=users[-1].id if limit and len(users) == limit else None,
     )
 
 
@@ -240,6 +245,33 @@ async def create_user(
     return UserResponse.model_validate(user)
 
 
+@router.post("/api/admin/users/bulk", response_model=UserBulkCreateResponse)
+async def create_users_bulk(
+    data: UserBulkCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role([UserRole.ADMIN])),
+):
+    """Utwórz wielu użytkowników w jednej transakcji (tylko admin)."""
+    auth = AuthService(db)
+
+    try:
+        created = auth.create_users_bulk([
+            {
+                "username": item.username,
+                "password": item.password,
+                "email": item.email,
+                "role": item.role,
+                "created_by_id": current_user.id,
+                "must_change_password": True,  # Jak przy pojedynczym tworzeniu
+            }
+            for item in data.users
+        ])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return UserBulkCreateResponse(created=created)
+
+
 @router.get("/api/admin/users/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
@@ -338,15 +370,18 @@ async def unlock_user(
 @router.get("/api/admin/api-keys", response_model=ApiKeyListResponse)
 async def list_api_keys(
     user_id: Optional[int] = Query(None, description="Filtruj po ID użytkownika"),
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Rozmiar strony"),
+    before_id: Optional[int] = Query(None, description="Kursor - ID ostatniego klucza z poprzedniej strony"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role([UserRole.ADMIN])),
 ):
     """Lista kluczy API (tylko admin)."""
     auth = AuthService(db)
-    keys = auth.list_api_keys(user_id)
+    keys = auth.list_api_keys(user_id, limit=limit, before_id=before_id)
     return ApiKeyListResponse(
         api_keys=[ApiKeyResponse.model_validate(k) for k in keys],
-        total=len(keys),
+        total=auth.count_api_keys(user_id),
+        next_before_id=keys[-1].id if limit and len(keys) == limit else None,
     )
 
 
@@ -2,10 +2,11 @@
 
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 
 from ..database import get_db
+from ..services.bulk_pricing import refresh_filter_options_view
 from ..services.excel_import import ExcelImporter
 
 router = APIRouter(prefix="/api/import", tags=["import-export"])
@@ -15,6 +16,7 @@ UPLOAD_DIR = Path("data/imports")
 
 @router.post("/excel")
 async def import_excel(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(..., description="Plik Excel do importu"),
     db: Session = Depends(get_db),
 ):
@@ -37,6 +39,7 @@ async def import_excel(
     try:
         importer = ExcelImporter(db)
         result = importer.import_file(file_path)
+        background_tasks.add_task(refresh_filter_options_view, db.get_bind())
         return {
             "status": "success",
             "filename": file.filename,
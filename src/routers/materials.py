@@ -2,12 +2,13 @@
 
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models.material import Material, MaterialCategory
 from ..schemas.pricing import MaterialCreate, MaterialResponse
+from ..services.bulk_pricing import refresh_filter_options_view
 
 router = APIRouter(prefix="/api/materials", tags=["materials"])
 
@@ -54,8 +55,10 @@ async def create_material(data: MaterialCreate, db: Session = Depends(get_db)):
 
 
 @router.delete("/{material_id}", status_code=204)
-async def delete_material(material_id: int, db: Session = Depends(get_db)):
-    """Usuń materiał."""
+async def delete_material(
+    material_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+):
+    """Usuń materiał (razem z jego cenami)."""
     material = db.query(Material).filter(Material.id == material_id).first()
 
     if not material:
@@ -63,3 +66,4 @@ async def delete_material(material_id: int, db: Session = Depends(get_db)):
 
     db.delete(material)
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
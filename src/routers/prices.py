@@ -2,7 +2,7 @@
 
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session, joinedload
@@ -19,6 +19,7 @@ from ..models.machine import (
     MACHINE_LIMITS, SOURCE_WIDTHS,
 )
 from ..schemas.pricing import BasePriceCreate, BasePriceResponse
+from ..services.bulk_pricing import refresh_filter_options_view
 
 router = APIRouter(prefix="/api/prices", tags=["prices"])
 templates = Jinja2Templates(directory="src/templates")
@@ -287,11 +288,14 @@ async def get_price(price_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/", response_model=BasePriceResponse, status_code=201)
-async def create_price(data: BasePriceCreate, db: Session = Depends(get_db)):
+async def create_price(
+    data: BasePriceCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+):
     """Utworz nowa cene."""
     price = BasePrice(**data.model_dump())
     db.add(price)
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
     db.refresh(price)
 
     return price
@@ -299,7 +303,10 @@ async def create_price(data: BasePriceCreate, db: Session = Depends(get_db)):
 
 @router.put("/{price_id}", response_model=BasePriceResponse)
 async def update_price(
-    price_id: int, data: BasePriceCreate, db: Session = Depends(get_db)
+    price_id: int,
+    data: BasePriceCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
 ):
     """Aktualizuj cene."""
     price = db.query(BasePrice).filter(BasePrice.id == price_id).first()
@@ -311,13 +318,16 @@ async def update_price(
         setattr(price, key, value)
 
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
     db.refresh(price)
 
     return price
 
 
 @router.delete("/{price_id}", status_code=204)
-async def delete_price(price_id: int, db: Session = Depends(get_db)):
+async def delete_price(
+    price_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+):
     """Usun cene."""
     price = db.query(BasePrice).filter(BasePrice.id == price_id).first()
 
@@ -326,6 +336,7 @@ async def delete_price(price_id: int, db: Session = Depends(get_db)):
 
     db.delete(price)
     db.commit()
+    background_tasks.add_task(refresh_filter_options_view, db.get_bind())
 
 
 @router.get("/grinding-options/")
@@ -29,6 +29,8 @@ from .admin import (
 
 from .user import (
     UserCreate,
+    UserBulkCreate,
+    UserBulkCreateResponse,
     UserUpdate,
     UserPasswordChange,
     UserPasswordReset,
@@ -72,6 +74,8 @@ __all__ = [
     "GrindingAvailabilityResponse",
     # User
     "UserCreate",
+    "UserBulkCreate",
+    "UserBulkCreateResponse",
     "UserUpdate",
     "UserPasswordChange",
     "UserPasswordReset",
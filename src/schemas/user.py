@@ -29,6 +29,16 @@ class UserCreate(UserBase):
         return v.lower()
 
 
+class UserBulkCreate(BaseModel):
+    """Schemat hurtowego tworzenia użytkowników."""
+    users: List[UserCreate] = Field(..., min_length=1, max_length=500)
+
+
+class UserBulkCreateResponse(BaseModel):
+    """Odpowiedź po hurtowym utworzeniu użytkowników."""
+    created: int
+
+
 class UserUpdate(BaseModel):
     """Schemat aktualizacji użytkownika."""
     email: Optional[str] = None
@@ -68,7 +78,8 @@ class UserResponse(BaseModel):
 class UserListResponse(BaseModel):
     """Lista użytkowników."""
     users: List[UserResponse]
-    total: int
+    total: int  # Liczba wszystkich użytkowników, nie rozmiar strony
+    next_before_id: Optional[int] = None  # Kursor następnej strony (gdy podano limit)
 
 
 # ============== API KEY SCHEMAS ==============
@@ -117,7 +128,8 @@ class ApiKeyCreatedResponse(ApiKeyResponse):
 class ApiKeyListResponse(BaseModel):
     """Lista kluczy API."""
     api_keys: List[ApiKeyResponse]
-    total: int
+    total: int  # Liczba wszystkich kluczy (po filtrze user_id), nie rozmiar strony
+    next_before_id: Optional[int] = None  # Kursor następnej strony (gdy podano limit)
 
 
 # ============== AUTH SCHEMAS ==============
@@ -1,15 +1,26 @@
 """Serwis autentykacji - hashowanie hasel, weryfikacja i zarządzanie użytkownikami."""
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, List
 
 import bcrypt
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session, aliased
 
 from ..models import User, UserRole, ApiKey
 from ..auth.permissions import hash_api_key, generate_api_key
 
 
+def _keyset_before(model, before_id: int):
+    """Warunek keyset: wiersze starsze niż (created_at, id) wiersza before_id."""
+    cursor = aliased(model)
+    cursor_created_at = (
+        select(cursor.created_at).where(cursor.id == before_id).scalar_subquery()
+    )
+    return tuple_(model.created_at, model.id) < tuple_(cursor_created_at, before_id)
+
+
 class AuthService:
     """Serwis do obslugi autentykacji i zarządzania użytkownikami."""
 
@@ -19,6 +30,20 @@ class AuthService:
     def __init__(self, db: Session):
         self.db = db
 
+    def _commit_keep_loaded(self) -> None:
+        """Commit bez wygaszania obiektów sesji (zamiast commit + refresh).
+
+        Kolumny User/ApiKey mają wartości domyślne po stronie Pythona, a klucz
+        główny jest znany po flush - obiekty po commit są aktualne, więc
+        ponowny SELECT przy odczycie atrybutów jest zbędny.
+        """
+        expire_on_commit = self.db.expire_on_commit
+        self.db.expire_on_commit = False
+        try:
+            self.db.commit()
+        finally:
+            self.db.expire_on_commit = expire_on_commit
+
     # ============== PASSWORD HASHING ==============
 
     def hash_password(self, password: str) -> str:
@@ -38,7 +63,12 @@ class AuthService:
 
     def authenticate(self, username: str, password: str) -> Optional[User]:
         """Uwierzytelnij uzytkownika. Zwraca User jesli sukces, None jesli blad."""
-        user = self.db.query(User).filter(User.username == username).first()
+        # lower(username) - trafia w unikalny indeks funkcyjny ix_users_username_lower
+        user = (
+            self.db.query(User)
+            .filter(func.lower(User.username) == username.lower())
+            .first()
+        )
 
         if not user:
             return None
@@ -67,17 +97,39 @@ class AuthService:
 
     def get_user_by_id(self, user_id: int) -> Optional[User]:
         """Pobierz uzytkownika po ID."""
-        return self.db.query(User).filter(User.id == user_id).first()
+        return self.get_user(user_id)
 
     # ============== USER CRUD ==============
 
-    def list_users(self) -> List[User]:
-        """Lista wszystkich użytkowników."""
-        return self.db.query(User).order_by(User.created_at.desc()).all()
+    def list_users(
+        self,
+        limit: Optional[int] = None,
+        before_id: Optional[int] = None,
+    ) -> List[User]:
+        """Lista użytkowników (od najnowszych).
+
+        Paginacja keyset po (created_at, id): before_id to ID ostatniego
+        użytkownika z poprzedniej strony.
+        """
+        query = self.db.query(User)
+        if before_id is not None:
+            query = query.filter(_keyset_before(User, before_id))
+        query = query.order_by(User.created_at.desc(), User.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def count_users(self) -> int:
+        """Liczba wszystkich użytkowników (niezależnie od paginacji)."""
+        return self.db.query(func.count(User.id)).scalar()
 
     def get_user(self, user_id: int) -> Optional[User]:
-        """Pobierz użytkownika po ID."""
-        return self.db.query(User).filter(User.id == user_id).first()
+        """Pobierz użytkownika po ID.
+
+        Session.get korzysta z identity map sesji - użytkownik załadowany już
+        w tym żądaniu (np. przez dependency autoryzacji) nie wymaga SELECT.
+        """
+        return self.db.get(User, user_id)
 
     def create_user(
         self,
@@ -90,7 +142,12 @@ class AuthService:
     ) -> User:
         """Utworz nowego uzytkownika."""
         # Sprawdź czy username już istnieje
-        existing = self.db.query(User).filter(User.username == username.lower()).first()
+        existing = (
+            self.db.query(User.id)
+            .filter(func.lower(User.username) == username.lower())
+            .limit(1)
+            .scalar()
+        )
         if existing:
             raise ValueError(f"Użytkownik '{username}' już istnieje")
 
@@ -103,10 +160,48 @@ class AuthService:
             must_change_password=must_change_password,
         )
         self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
+        self._commit_keep_loaded()
         return user
 
+    def create_users_bulk(self, specs: List[dict]) -> int:
+        """Utwórz wielu użytkowników w jednej transakcji (skrypty, import).
+
+        Każdy element specs ma klucze jak argumenty create_user (username,
+        password, opcjonalnie email, role, created_by_id, must_change_password).
+        Nie zwraca obiektów User - tylko liczbę utworzonych kont.
+        """
+        usernames = [spec["username"].lower() for spec in specs]
+        if len(set(usernames)) != len(usernames):
+            raise ValueError("Powtórzone nazwy użytkowników w danych wejściowych")
+
+        existing = (
+            self.db.query(User.username)
+            .filter(func.lower(User.username).in_(usernames))
+            .first()
+        )
+        if existing:
+            raise ValueError(f"Użytkownik '{existing.username}' już istnieje")
+
+        # bcrypt zwalnia GIL - hashowanie równolegle w wątkach
+        with ThreadPoolExecutor() as pool:
+            hashes = list(pool.map(self.hash_password, (spec["password"] for spec in specs)))
+
+        rows = [
+            {
+                "username": username,
+                "email": spec.get("email"),
+                "hashed_password": hashed,
+                "role": UserRole(spec.get("role", UserRole.VIEWER)).value,
+                "created_by_id": spec.get("created_by_id"),
+                "must_change_password": spec.get("must_change_password", False),
+            }
+            for spec, username, hashed in zip(specs, usernames, hashes)
+        ]
+        if rows:
+            self.db.execute(insert(User), rows)
+        self.db.commit()
+        return len(rows)
+
     def update_user(
         self,
         user_id: int,
@@ -130,8 +225,7 @@ class AuthService:
                 user.failed_login_attempts = 0
                 user.locked_until = None
 
-        self.db.commit()
-        self.db.refresh(user)
+        self._commit_keep_loaded()
         return user
 
     def delete_user(self, user_id: int) -> bool:
@@ -160,8 +254,7 @@ class AuthService:
         user.failed_login_attempts = 0
         user.locked_until = None
 
-        self.db.commit()
-        self.db.refresh(user)
+        self._commit_keep_loaded()
         return user
 
     def change_password(
@@ -193,18 +286,37 @@ class AuthService:
         user.failed_login_attempts = 0
         user.locked_until = None
 
-        self.db.commit()
-        self.db.refresh(user)
+        self._commit_keep_loaded()
         return user
 
     # ============== API KEY CRUD ==============
 
-    def list_api_keys(self, user_id: Optional[int] = None) -> List[ApiKey]:
-        """Lista kluczy API (opcjonalnie filtrowana po użytkowniku)."""
+    def list_api_keys(
+        self,
+        user_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        before_id: Optional[int] = None,
+    ) -> List[ApiKey]:
+        """Lista kluczy API (opcjonalnie filtrowana po użytkowniku).
+
+        Paginacja keyset jak w list_users.
+        """
         query = self.db.query(ApiKey)
         if user_id:
             query = query.filter(ApiKey.user_id == user_id)
-        return query.order_by(ApiKey.created_at.desc()).all()
+        if before_id is not None:
+            query = query.filter(_keyset_before(ApiKey, before_id))
+        query = query.order_by(ApiKey.created_at.desc(), ApiKey.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def count_api_keys(self, user_id: Optional[int] = None) -> int:
+        """Liczba kluczy API (z tym samym filtrem co list_api_keys, bez paginacji)."""
+        query = self.db.query(func.count(ApiKey.id))
+        if user_id:
+            query = query.filter(ApiKey.user_id == user_id)
+        return query.scalar()
 
     def create_api_key(
         self,
@@ -239,8 +351,7 @@ class AuthService:
         )
 
         self.db.add(api_key)
-        self.db.commit()
-        self.db.refresh(api_key)
+        self._commit_keep_loaded()
 
         return api_key, raw_key
 
@@ -261,6 +372,5 @@ class AuthService:
             return None
 
         api_key.is_active = False
-        self.db.commit()
-        self.db.refresh(api_key)
+        self._commit_keep_loaded()
         return api_key
@@ -1,11 +1,15 @@
 """Serwis do zbiorczych operacji na cenach."""
 
-import json
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
 from typing import Optional
 from math import ceil
 
-from sqlalchemy import func
+from sqlalchemy import (
+    func, case, cast, column, inspect, select, table, text, update, values,
+    Float, Numeric,
+)
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, joinedload
 
 from ..models.price import BasePrice, PriceChangeAudit
@@ -20,12 +24,77 @@ from ..schemas.admin import (
 )
 
 
+# Mapowanie wartości kategorii na enum (bez try/except dla każdej wartości)
+_CATEGORY_BY_VALUE = {c.value: c for c in MaterialCategory}
+
+# Widok zmaterializowany z kombinacjami wartości filtrów (tylko PostgreSQL,
+# tworzony migracją Alembic). Endpointy zmieniające ceny lub materiały zlecają
+# jego odświeżenie jako zadanie w tle (refresh_filter_options_view)
+FILTER_OPTIONS_VIEW = "mv_bulk_filter_options"
+
+_filter_options_view = table(
+    FILTER_OPTIONS_VIEW,
+    column("category", Material.category.type),
+    column("group_id"),
+    column("grade"),
+    column("surface_finish"),
+    column("width"),
+    column("thickness_min"),
+    column("thickness_max"),
+)
+
+# Engine, na których widok już istnieje. Zapamiętywany jest tylko wynik
+# pozytywny - widok utworzony migracją po starcie aplikacji zostanie wykryty
+# przy następnym sprawdzeniu, bez restartu
+_engines_with_view: set[Engine] = set()
+
+
+def has_filter_options_view(bind: Engine) -> bool:
+    """Czy baza ma widok zmaterializowany opcji filtrów."""
+    if bind.dialect.name != "postgresql":
+        return False
+    if bind not in _engines_with_view:
+        if FILTER_OPTIONS_VIEW not in inspect(bind).get_materialized_view_names():
+            return False
+        _engines_with_view.add(bind)
+    return True
+
+
+def refresh_filter_options_view(bind: Engine) -> None:
+    """Odśwież widok opcji filtrów (bez blokowania odczytów)."""
+    if not has_filter_options_view(bind):
+        return
+    with bind.begin() as conn:
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {FILTER_OPTIONS_VIEW}"))
+
+
 class BulkPricingService:
     """Serwis do zbiorczych zmian cen z filtrami."""
 
+    # Powyżej tylu wartości filtr IN jest budowany z listy VALUES (PostgreSQL)
+    IN_VALUES_THRESHOLD = 64
+
     def __init__(self, db: Session):
         self.db = db
 
+    def _in_filter(self, col, filter_values: list):
+        """Warunek col IN (...) dla filtrów multi-select.
+
+        Długie listy na PostgreSQL trafiają do podzapytania z VALUES zamiast
+        setek parametrów - planner może wtedy wybrać złączenie po indeksie.
+        SQLite nie obsługuje aliasów kolumn dla VALUES, więc zostaje przy IN.
+        """
+        if (
+            len(filter_values) < self.IN_VALUES_THRESHOLD
+            or self.db.get_bind().dialect.name != "postgresql"
+        ):
+            return col.in_(filter_values)
+
+        value_list = values(column("v", col.type), name="vs").data(
+            [(v,) for v in filter_values]
+        )
+        return col.in_(select(value_list.c.v))
+
     def build_filter_query(self, filters: BulkPriceFilterRequest):
         """Buduje zapytanie SQL z zastosowanymi filtrami."""
         query = (
@@ -38,26 +107,23 @@ class BulkPricingService:
 
         # Filtr kategorii (multi-select)
         if filters.categories:
-            category_enums = []
-            for cat in filters.categories:
-                try:
-                    category_enums.append(MaterialCategory(cat))
-                except ValueError:
-                    pass
+            category_enums = [
+                _CATEGORY_BY_VALUE[c] for c in filters.categories if c in _CATEGORY_BY_VALUE
+            ]
             if category_enums:
-                query = query.filter(Material.category.in_(category_enums))
+                query = query.filter(self._in_filter(Material.category, category_enums))
 
         # Filtr grup materiałów (multi-select)
         if filters.group_ids:
-            query = query.filter(Material.group_id.in_(filters.group_ids))
+            query = query.filter(self._in_filter(Material.group_id, filters.group_ids))
 
         # Filtr gatunków (multi-select)
         if filters.grades:
-            query = query.filter(Material.grade.in_(filters.grades))
+            query = query.filter(self._in_filter(Material.grade, filters.grades))
 
         # Filtr wykończeń (multi-select)
         if filters.surface_finishes:
-            query = query.filter(BasePrice.surface_finish.in_(filters.surface_finishes))
+            query = query.filter(self._in_filter(BasePrice.surface_finish, filters.surface_finishes))
 
         # Filtr grubości
         if filters.thickness_min is not None:
@@ -67,7 +133,7 @@ class BulkPricingService:
 
         # Filtr szerokości (multi-select przyciski)
         if filters.widths:
-            query = query.filter(BasePrice.width.in_(filters.widths))
+            query = query.filter(self._in_filter(BasePrice.width, filters.widths))
 
         return query
 
@@ -78,7 +144,12 @@ class BulkPricingService:
         change_value: float,
         round_to: int = 2
     ) -> float:
-        """Oblicza nową cenę na podstawie typu i wartości zmiany."""
+        """Oblicza nową cenę na podstawie typu i wartości zmiany.
+
+        Zaokrąglenie "połówka w górę" na wartości dziesiętnej (2.675 -> 2.68),
+        tak jak ROUND(CAST(x AS NUMERIC), n) w new_price_expression - a nie
+        round() na liczbie binarnej (2.675 -> 2.67).
+        """
         if change_type == "percentage":
             new_price = current_price * (1 + change_value / 100)
         else:  # absolute
@@ -87,7 +158,25 @@ class BulkPricingService:
         # Nie pozwól na ujemne ceny
         new_price = max(0, new_price)
 
-        return round(new_price, round_to)
+        return float(
+            Decimal(str(new_price)).quantize(Decimal(1).scaleb(-round_to), rounding=ROUND_HALF_UP)
+        )
+
+    def new_price_expression(self, change_type: str, change_value: float, round_to: int = 2):
+        """Wyrażenie SQL liczące nową cenę - odpowiednik calculate_new_price.
+
+        Zaokrąglenie na typie numeric: połówka w górę na wartości dziesiętnej.
+        """
+        if change_type == "percentage":
+            new_price = BasePrice.price_pln_per_kg * (1 + change_value / 100)
+        else:  # absolute
+            new_price = BasePrice.price_pln_per_kg + change_value
+
+        # Nie pozwól na ujemne ceny (CASE zamiast GREATEST - działa też w SQLite)
+        new_price = case((new_price > 0, new_price), else_=0)
+
+        # PostgreSQL zaokrągla do N miejsc tylko typ numeric
+        return cast(func.round(cast(new_price, Numeric), round_to), Float)
 
     def preview_changes(
         self,
@@ -100,35 +189,30 @@ class BulkPricingService:
     ) -> BulkPricePreviewResponse:
         """Generuje podgląd zmian bez zapisywania."""
         query = self.build_filter_query(filters)
+        new_price_expr = self.new_price_expression(change_type, change_value, round_to)
 
-        # Dodaj eager loading dla materiału i grupy
-        query = query.options(
-            joinedload(BasePrice.material).joinedload(Material.group)
-        )
+        # Sumy liczone po stronie bazy - bez ładowania wszystkich wierszy
+        total_affected, total_current, total_new = query.with_entities(
+            func.count(BasePrice.id),
+            func.coalesce(func.sum(BasePrice.price_pln_per_kg), 0),
+            func.coalesce(func.sum(new_price_expr), 0),
+        ).one()
 
-        # Pobierz wszystkie pasujące ceny
-        all_prices = query.all()
-        total_affected = len(all_prices)
-
-        # Oblicz sumy
-        total_current = sum(p.price_pln_per_kg for p in all_prices)
-        total_new = sum(
-            self.calculate_new_price(p.price_pln_per_kg, change_type, change_value, round_to)
-            for p in all_prices
-        )
-
-        # Paginacja
+        # Paginacja - ładujemy tylko bieżącą stronę
         total_pages = max(1, ceil(total_affected / per_page))
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        page_prices = all_prices[start_idx:end_idx]
+        # Nowa cena liczona tym samym wyrażeniem SQL co w apply_changes
+        page_rows = (
+            query.options(joinedload(BasePrice.material).joinedload(Material.group))
+            .add_columns(new_price_expr)
+            .order_by(BasePrice.id)
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+            .all()
+        )
 
         # Buduj elementy podglądu
         items = []
-        for price in page_prices:
-            new_price = self.calculate_new_price(
-                price.price_pln_per_kg, change_type, change_value, round_to
-            )
+        for price, new_price in page_rows:
             items.append(BulkPricePreviewItem(
                 id=price.id,
                 material_grade=price.material.grade,
@@ -164,30 +248,58 @@ class BulkPricingService:
         notes: Optional[str] = None
     ) -> BulkPriceChangeResponse:
         """Aplikuje zmiany cen i tworzy wpis audytu."""
-        query = self.build_filter_query(filters)
-        prices = query.all()
-
-        updated_count = 0
-        skipped_count = 0
-        total_previous = 0.0
-        total_new = 0.0
-
-        for price in prices:
-            old_price = price.price_pln_per_kg
-            new_price = self.calculate_new_price(old_price, change_type, change_value, round_to)
+        if change_value == 0:
+            # Zmiana zerowa - nic do zapisania; wpis audytu tylko gdy podano notatkę
+            if notes:
+                self.db.add(PriceChangeAudit(
+                    change_type=f"bulk_{change_type}",
+                    filters_json=filters.model_dump(mode="json"),
+                    change_value=change_value,
+                    affected_count=0,
+                    previous_total=0,
+                    new_total=0,
+                    user_id=user.id,
+                    notes=notes
+                ))
+                self.db.commit()
+            return BulkPriceChangeResponse(
+                success=True,
+                updated_count=0,
+                skipped_count=0,
+                total_previous=0,
+                total_new=0,
+                change_type=change_type,
+                change_value=change_value
+            )
 
-            if new_price != old_price:
-                total_previous += old_price
-                total_new += new_price
-                price.price_pln_per_kg = new_price
-                updated_count += 1
-            else:
-                skipped_count += 1
+        query = self.build_filter_query(filters)
+        new_price = self.new_price_expression(change_type, change_value, round_to)
+        changed = new_price != BasePrice.price_pln_per_kg
+
+        # Statystyki liczone po stronie bazy - bez ładowania wierszy
+        matched_count, updated_count, total_previous, total_new = query.with_entities(
+            func.count(BasePrice.id),
+            func.count(case((changed, 1))),
+            func.coalesce(func.sum(case((changed, BasePrice.price_pln_per_kg), else_=0)), 0),
+            func.coalesce(func.sum(case((changed, new_price), else_=0)), 0),
+        ).one()
+        skipped_count = matched_count - updated_count
+
+        # Jeden UPDATE zamiast osobnego zapytania dla każdej ceny
+        if updated_count:
+            ids = query.with_entities(BasePrice.id).subquery()
+            self.db.execute(
+                update(BasePrice)
+                .where(BasePrice.id.in_(select(ids.c.id)))
+                .where(changed)
+                .values(price_pln_per_kg=new_price)
+                .execution_options(synchronize_session=False)
+            )
 
         # Utwórz wpis audytu
         audit_entry = PriceChangeAudit(
             change_type=f"bulk_{change_type}",
-            filters_json=json.dumps(filters.model_dump(), ensure_ascii=False),
+            filters_json=filters.model_dump(mode="json"),
             change_value=change_value,
             affected_count=updated_count,
             previous_total=round(total_previous, 2),
@@ -208,6 +320,46 @@ class BulkPricingService:
             change_value=change_value
         )
 
+    def _filter_combinations(self) -> list:
+        """Unikalne kombinacje (kategoria, grupa, gatunek, wykończenie, szerokość)
+        aktywnych cen wraz z zakresem grubości.
+
+        Na PostgreSQL czytane z widoku zmaterializowanego, w pozostałych
+        przypadkach liczone na żywo.
+        """
+        if has_filter_options_view(self.db.get_bind()):
+            mv = _filter_options_view.c
+            return self.db.execute(
+                select(
+                    mv.category, mv.group_id, mv.grade, mv.surface_finish, mv.width,
+                    mv.thickness_min, mv.thickness_max,
+                )
+            ).all()
+
+        return (
+            self.db.query(
+                Material.category,
+                Material.group_id,
+                Material.grade,
+                BasePrice.surface_finish,
+                BasePrice.width,
+                func.min(BasePrice.thickness),
+                func.max(BasePrice.thickness),
+            )
+            .select_from(BasePrice)
+            .join(Material, BasePrice.material_id == Material.id)
+            .filter(BasePrice.is_active == True)
+            .filter(BasePrice.price_pln_per_kg > 0)
+            .group_by(
+                Material.category,
+                Material.group_id,
+                Material.grade,
+                BasePrice.surface_finish,
+                BasePrice.width,
+            )
+            .all()
+        )
+
     def get_filter_options(
         self,
         categories: Optional[list[str]] = None,
@@ -221,61 +373,58 @@ class BulkPricingService:
         Każdy filtr wpływa na wszystkie pozostałe listy.
         """
         # Konwertuj kategorie na enumy
-        category_enums = []
-        if categories:
-            for cat in categories:
-                try:
-                    category_enums.append(MaterialCategory(cat))
-                except ValueError:
-                    pass
-
-        # Bazowe zapytanie dla cen (wspólne filtry)
-        def base_price_query():
-            return (
-                self.db.query(BasePrice)
-                .join(Material, BasePrice.material_id == Material.id)
-                .outerjoin(MaterialGroup, Material.group_id == MaterialGroup.id)
-                .filter(BasePrice.is_active == True)
-                .filter(BasePrice.price_pln_per_kg > 0)
-            )
+        category_enums = [
+            _CATEGORY_BY_VALUE[c] for c in categories or () if c in _CATEGORY_BY_VALUE
+        ]
 
-        # Aplikuj filtry do zapytania
-        def apply_filters(query, skip_filter=None):
-            if category_enums and skip_filter != 'categories':
-                query = query.filter(Material.category.in_(category_enums))
-            if group_ids and skip_filter != 'groups':
-                query = query.filter(Material.group_id.in_(group_ids))
-            if grades and skip_filter != 'grades':
-                query = query.filter(Material.grade.in_(grades))
-            if surface_finishes and skip_filter != 'surface_finishes':
-                query = query.filter(BasePrice.surface_finish.in_(surface_finishes))
-            if widths and skip_filter != 'widths':
-                query = query.filter(BasePrice.width.in_(widths))
-            return query
-
-        # === Kategorie - filtrowane przez pozostałe wybory ===
-        cat_query = apply_filters(base_price_query(), skip_filter='categories')
-        available_categories = set(
-            m.category for m in
-            self.db.query(Material.category)
-            .filter(Material.id.in_(cat_query.with_entities(BasePrice.material_id).distinct()))
-            .distinct().all()
+        # Jedno zapytanie: unikalne kombinacje wartości filtrów z zakresem grubości.
+        # Kombinacji jest niewiele (gatunki x wykończenia x szerokości), więc
+        # dwukierunkowe filtrowanie liczymy po stronie Pythona w jednym przebiegu.
+        combinations = self._filter_combinations()
+
+        # Kolejność jak kolumny w _filter_combinations
+        selected_filters = (
+            ('categories', set(category_enums)),
+            ('groups', set(group_ids or ())),
+            ('grades', set(grades or ())),
+            ('surface_finishes', set(surface_finishes or ())),
+            ('widths', set(widths or ())),
         )
+        available = {name: set() for name, _ in selected_filters}
+        thickness_min = None
+        thickness_max = None
+
+        for row in combinations:
+            values = row[:5]
+            failed = [
+                name for (name, selected), value in zip(selected_filters, values)
+                if selected and value not in selected
+            ]
+            # Wiersz odrzucony przez dwa filtry nie wpływa na żadną listę
+            if len(failed) > 1:
+                continue
+
+            # Każda lista filtrowana jest przez pozostałe wybory
+            for (name, _), value in zip(selected_filters, values):
+                if not failed or failed[0] == name:
+                    available[name].add(value)
+
+            # Zakres grubości - filtrowany przez wszystkie wybory
+            if not failed:
+                row_min, row_max = row[5], row[6]
+                thickness_min = row_min if thickness_min is None else min(thickness_min, row_min)
+                thickness_max = row_max if thickness_max is None else max(thickness_max, row_max)
+
+        any_filter = categories or group_ids or grades or surface_finishes or widths
+
+        # === Kategorie ===
         categories_list = [
             {"value": c.value, "label": c.name}
             for c in MaterialCategory
-            if not (categories or group_ids or grades or surface_finishes or widths) or c in available_categories
+            if not any_filter or c in available['categories']
         ]
 
-        # === Grupy - filtrowane przez pozostałe wybory ===
-        groups_query = apply_filters(base_price_query(), skip_filter='groups')
-        available_group_ids = set(
-            m.group_id for m in
-            self.db.query(Material.group_id)
-            .filter(Material.id.in_(groups_query.with_entities(BasePrice.material_id).distinct()))
-            .filter(Material.group_id.isnot(None))
-            .distinct().all()
-        )
+        # === Grupy ===
         all_groups = (
             self.db.query(MaterialGroup)
             .filter(MaterialGroup.is_active == True)
@@ -285,40 +434,17 @@ class BulkPricingService:
         groups = [
             {"id": g.id, "name": g.name, "category": g.category.value}
             for g in all_groups
-            if not (categories or group_ids or grades or surface_finishes or widths) or g.id in available_group_ids
+            if not any_filter or g.id in available['groups']
         ]
 
-        # === Gatunki - filtrowane przez pozostałe wybory ===
-        grades_subquery = apply_filters(base_price_query(), skip_filter='grades')
-        available_grades_set = set(
-            m.grade for m in
-            self.db.query(Material.grade)
-            .filter(Material.id.in_(grades_subquery.with_entities(BasePrice.material_id).distinct()))
-            .distinct().all()
-        )
-        available_grades = sorted(list(available_grades_set))
-
-        # === Wykończenia - filtrowane przez pozostałe wybory ===
-        finishes_query = apply_filters(base_price_query(), skip_filter='surface_finishes')
-        available_finishes = sorted([
-            f[0] for f in finishes_query.with_entities(BasePrice.surface_finish).distinct().all()
-        ])
-
-        # === Szerokości - filtrowane przez pozostałe wybory ===
-        widths_query = apply_filters(base_price_query(), skip_filter='widths')
-        available_widths = sorted([
-            w[0] for w in widths_query.with_entities(BasePrice.width).distinct().all()
-        ])
-
-        # === Zakres grubości - filtrowane przez wszystkie wybory ===
-        thickness_query = apply_filters(base_price_query())
-        thickness_stats = thickness_query.with_entities(
-            func.min(BasePrice.thickness),
-            func.max(BasePrice.thickness)
-        ).first()
+        # === Gatunki, wykończenia, szerokości ===
+        available_grades = sorted(available['grades'])
+        available_finishes = sorted(available['surface_finishes'])
+        available_widths = sorted(available['widths'])
+
         thickness_range = {
-            "min": thickness_stats[0] or 0,
-            "max": thickness_stats[1] or 0
+            "min": thickness_min or 0,
+            "max": thickness_max or 0
         }
 
         return BulkFilterOptionsResponse(
@@ -358,7 +484,7 @@ class BulkPricingService:
                 "new_total": a.new_total,
                 "user": a.user.username if a.user else "unknown",
                 "created_at": a.created_at.isoformat(),
-                "filters": json.loads(a.filters_json) if a.filters_json else None,
+                "filters": a.filters_json,
                 "notes": a.notes
             }
             for a in audits
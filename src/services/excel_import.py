@@ -1,12 +1,18 @@
 """Serwis do importu danych z plików Excel - rozbudowany parser."""
 
+import math
 import uuid
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
+from itertools import islice
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 from datetime import datetime
 
+import numpy as np
+import openpyxl
 import pandas as pd
+from pandas.io.parsers import TextParser
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 
 from ..models import (
@@ -24,6 +30,138 @@ from ..models import (
     EXCEL_FILM_MAPPING,
     EXCEL_GRINDING_MAPPING,
 )
+from .grinding_validation import invalidate_grinding_matrices
+from .pricing import invalidate_price_lookups
+
+
+# Liczba wierszy pokazywanych w podglądzie arkusza
+PREVIEW_ROWS = 10
+
+# Maksymalna liczba wierszy w jednym wsadowym INSERT/UPDATE
+BATCH_SIZE = 10_000
+
+# Początkowe kolumny arkusza 'cennik baza' w standardowym układzie - tylko
+# one są potrzebne do importu cen bazowych
+BASE_PRICE_COLUMNS = ("ID", "Gatunek", "powierzchnia", "grubość", "szerokość", "długość", "z papierem")
+
+
+def _iter_sheet_rows(ws):
+    """Wiersze arkusza openpyxl przygotowane tak jak w pd.read_excel.
+
+    Puste komórki to "", liczby całkowite zapisane jako float stają się int,
+    końcowe puste komórki wiersza są obcinane.
+    """
+    for row in ws.iter_rows(values_only=True):
+        values = [
+            "" if v is None else int(v) if isinstance(v, float) and v.is_integer() else v
+            for v in row
+        ]
+        while values and values[-1] == "":
+            values.pop()
+        yield values
+
+
+def _last_data_row(rows) -> int:
+    """Numer (od 1) ostatniego niepustego wiersza z _iter_sheet_rows, 0 dla pustego arkusza."""
+    last = 0
+    for row_number, row in enumerate(rows, start=1):
+        if row:
+            last = row_number
+    return last
+
+
+def _read_sheet(ws) -> pd.DataFrame:
+    """Cały arkusz openpyxl jako DataFrame - odpowiednik pd.read_excel(header=None)."""
+    return _rows_to_frame(list(_iter_sheet_rows(ws)))
+
+
+def _rows_to_frame(rows: list[list], dtype=None) -> pd.DataFrame:
+    """DataFrame z wierszy _iter_sheet_rows - ten sam wynik co pd.read_excel(header=None).
+
+    dtype=object pozostawia wartości komórek bez zgadywania typu kolumny.
+    """
+    # Końcowe puste wiersze są pomijane, krótsze wiersze dopełniane do pełnej szerokości
+    while rows and not rows[-1]:
+        rows = rows[:-1]
+    if not rows:
+        return pd.DataFrame()
+
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    return TextParser(rows, header=None, dtype=dtype).read()
+
+
+def _classify_grit_columns(names: list[str]) -> list[tuple[Optional[str], bool]]:
+    """Granulacja i znacznik SB dla nagłówków kolumn cennika szlifu.
+
+    Liczone raz dla wiersza nagłówkowego, a nie dla każdej komórki z ceną.
+    Kolejność warunków: K320/K400, potem K240/K180, potem K80/K120.
+    """
+    headers = pd.Series(names, dtype=object)
+    grits = np.select(
+        [
+            headers.str.contains("K320|K400"),
+            headers.str.contains("K240|K180"),
+            headers.str.contains("K80|K120"),
+        ],
+        ["K320/K400", "K240/K180", "K80/K120"],
+        default=None,
+    )
+    with_sb = headers.str.contains("+SB", regex=False) | (headers == "SB [zł/kg]")
+    return list(zip(grits.tolist(), with_sb.tolist()))
+
+
+def _non_negative_numbers(df: pd.DataFrame) -> np.ndarray:
+    """Komórki arkusza jako tablica float - liczby >= 0, pozostałe (tekst,
+    puste, ujemne) jako NaN.
+
+    Jedna konwersja całego arkusza zamiast sprawdzania każdej komórki
+    przez str(...).replace(".", "").isdigit().
+    """
+    numbers = df.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float, copy=True)
+    numbers[~(np.isfinite(numbers) & (numbers >= 0))] = np.nan
+    return numbers
+
+
+def _film_header_row(df: pd.DataFrame) -> Optional[int]:
+    """Pozycja wiersza nagłówkowego cennika folii (Novacel/FOLIA/Nitto) lub None.
+
+    Jedno przeszukanie całego arkusza na tablicy napisów zamiast iterrows.
+    """
+    cells = df.to_numpy().astype(str)
+    found = np.zeros(cells.shape, dtype=bool)
+    for token in ("Novacel", "FOLIA", "Nitto"):
+        found |= np.char.find(cells, token) >= 0
+    rows = np.flatnonzero(found.any(axis=1))
+    return int(rows[0]) if len(rows) else None
+
+
+def _film_prices(df: pd.DataFrame, header_row: int):
+    """Ceny z cennika folii pod wierszem nagłówkowym.
+
+    Zwraca krotki (pozycja wiersza, typ folii, grubość, cena) w kolejności
+    wierszy i kolumn. Grubości i ceny konwertowane są raz dla całego
+    arkusza; wiersze bez grubości i komórki nieliczbowe są pomijane.
+    """
+    headers = {}
+    for col_idx, val in enumerate(df.iloc[header_row]):
+        val_str = str(val).strip()
+        if val_str in EXCEL_FILM_MAPPING:
+            headers[col_idx] = EXCEL_FILM_MAPPING[val_str]
+    film_columns = list(headers)
+
+    numbers = df.iloc[header_row + 1:].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    thicknesses = numbers[:, 0]
+    prices = numbers[:, film_columns]
+    valid = ~np.isnan(prices) & ~np.isnan(thicknesses)[:, None]
+
+    for row, col in np.argwhere(valid):
+        yield (
+            header_row + 1 + int(row),
+            headers[film_columns[col]],
+            float(thicknesses[row]),
+            float(prices[row, col]),
+        )
 
 
 @dataclass
@@ -150,23 +288,47 @@ class ExcelImporter:
     def __init__(self, db: Optional[Session] = None):
         self.db = db
         self.result = ImportResult()
+        # Cache materiałów po gatunku, ładowany przy pierwszym użyciu
+        self._material_by_grade: Optional[dict[str, Material]] = None
 
     def preview_file(self, file_path: Path) -> dict[str, Any]:
         """Podgląd struktury pliku Excel."""
-        xl = pd.ExcelFile(file_path)
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            return self.preview_workbook(wb, file_path.name)
+        finally:
+            wb.close()
+
+    def preview_workbook(self, wb: openpyxl.Workbook, filename: str) -> dict[str, Any]:
+        """Podgląd struktury już otwartego skoroszytu.
 
+        Z każdego arkusza czytane są tylko wiersze podglądu; liczba wierszy
+        pochodzi z wymiarów arkusza zapisanych w pliku.
+        """
         preview = {
-            "filename": file_path.name,
+            "filename": filename,
             "sheets": [],
         }
 
-        for sheet_name in xl.sheet_names:
-            df = pd.read_excel(xl, sheet_name=sheet_name, nrows=10, header=None)
+        for ws in wb.worksheets:
+            head = list(islice(_iter_sheet_rows(ws), PREVIEW_ROWS))
+
+            # Liczba wierszy z wymiarów zapisanych w arkuszu - bez czytania
+            # całego arkusza
+            rows_count = ws.max_row
+            if rows_count is None:
+                # Plik bez wymiarów arkusza - policz wiersze z danymi
+                rows_count = _last_data_row(_iter_sheet_rows(ws))
+            elif rows_count <= PREVIEW_ROWS:
+                # Krótki arkusz jest już w całości w podglądzie
+                rows_count = _last_data_row(head)
+
+            df = _rows_to_frame(head)
             preview["sheets"].append({
-                "name": sheet_name,
+                "name": ws.title,
                 "columns_count": df.shape[1],
-                "rows_count": len(pd.read_excel(xl, sheet_name=sheet_name, header=None)),
-                "preview": df.head(10).fillna("").to_dict(orient="records"),
+                "rows_count": rows_count,
+                "preview": df.fillna("").to_dict(orient="records"),
             })
 
         return preview
@@ -183,7 +345,21 @@ class ExcelImporter:
         if not self.db:
             raise ValueError("Brak połączenia z bazą danych")
 
-        xl = pd.ExcelFile(file_path)
+        # openpyxl w trybie read_only - bez warstwy pd.read_excel
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            return self.import_workbook(wb)
+        finally:
+            wb.close()
+
+    def import_workbook(self, wb: openpyxl.Workbook) -> ImportResult:
+        """Importuj dane z już otwartego skoroszytu (openpyxl, read_only).
+
+        Pozwala wykonać podgląd i import na jednym otwarciu pliku.
+        """
+        if not self.db:
+            raise ValueError("Brak połączenia z bazą danych")
+
         self.result = ImportResult()
 
         # Przetwarzaj arkusze w odpowiedniej kolejności
@@ -194,25 +370,46 @@ class ExcelImporter:
             "DANE FOLIA": self._import_film_prices,
         }
 
-        for sheet_name, handler in sheet_handlers.items():
-            if sheet_name in xl.sheet_names:
-                try:
-                    df = pd.read_excel(xl, sheet_name=sheet_name, header=None)
-                    handler(df, sheet_name)
-                    self.result.sheets_processed += 1
-                except Exception as e:
-                    self.result.errors.append({
-                        "sheet": sheet_name,
-                        "error": str(e),
-                    })
-                    self.result.success = False
+        # Cały import w jednej transakcji: bez autoflush przy zapytaniach,
+        # flush raz na arkusz i jeden commit na końcu. Każdy arkusz w osobnym
+        # SAVEPOINT - błąd w dalszej paczce wycofuje cały arkusz, a nie
+        # zostawia jego wcześniejszych paczek (na PostgreSQL nie przerywa też
+        # transakcji dla kolejnych arkuszy)
+        with self.db.no_autoflush:
+            for sheet_name, handler in sheet_handlers.items():
+                if sheet_name in wb.sheetnames:
+                    # Kopia liczników sprzed arkusza (listy errors/warnings
+                    # są współdzielone - ostrzeżenia z arkusza zostają)
+                    result_before = replace(self.result)
+                    try:
+                        with self.db.begin_nested():
+                            handler(_iter_sheet_rows(wb[sheet_name]), sheet_name)
+                            self.db.flush()
+                        self.result.sheets_processed += 1
+                    except Exception as e:
+                        self.result = result_before
+                        # Materiały utworzone w wycofanym arkuszu nie istnieją
+                        self._material_by_grade = None
+                        self.result.errors.append({
+                            "sheet": sheet_name,
+                            "error": str(e),
+                        })
+                        self.result.success = False
 
         self.db.commit()
+        # Zaimportowane ceny folii i szlifu zastępują zapamiętane matryce i ceny
+        invalidate_grinding_matrices()
+        invalidate_price_lookups()
         return self.result
 
     def _get_or_create_material(self, grade: str) -> Material:
         """Pobierz lub stwórz materiał na podstawie gatunku."""
-        material = self.db.query(Material).filter(Material.grade == grade).first()
+        if self._material_by_grade is None:
+            self._material_by_grade = {}
+            for m in self.db.query(Material).order_by(Material.id):
+                self._material_by_grade.setdefault(m.grade, m)
+
+        material = self._material_by_grade.get(grade)
 
         if not material:
             if grade in self.GRADE_MAPPING:
@@ -230,11 +427,17 @@ class ExcelImporter:
             )
             self.db.add(material)
             self.db.flush()
+            self._material_by_grade[grade] = material
             self.result.materials_imported += 1
 
         return material
 
-    def _import_base_prices(self, df: pd.DataFrame, sheet_name: str):
+    def _execute_batched(self, statement, rows: list[dict]):
+        """Wykonaj insert()/update() wsadowo - jedno zapytanie na paczkę wierszy."""
+        for start in range(0, len(rows), BATCH_SIZE):
+            self.db.execute(statement, rows[start:start + BATCH_SIZE])
+
+    def _import_base_prices(self, rows: Iterable[list], sheet_name: str):
         """Import cen bazowych z arkusza 'cennik baza'.
 
         Kolumny:
@@ -243,56 +446,153 @@ class ExcelImporter:
         szlif BABCIA + FZ, szlif BABCIA + FF,
         szlif CAMU + FZ, szlif CAMU + FF,
         szlif BORYS + FZ, szlif BORYS + FF
+
+        Wiersze czytane są strumieniowo paczkami po BATCH_SIZE - w pamięci
+        jest tylko bieżąca paczka, a nie cały arkusz.
         """
+        rows = iter(rows)
+
         # Pierwszy wiersz to nagłówki
-        headers = [str(h).strip() for h in df.iloc[0].tolist()]
-        df = df.iloc[1:].copy()
-        df.columns = headers
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+        headers = [str(h).strip() for h in header_row]
+
+        # Standardowy układ kolumn: kolumny szlifów za "z papierem" nie są
+        # parsowane. Przy innym układzie nagłówków - wszystkie kolumny
+        fixed_layout = tuple(headers[:len(BASE_PRICE_COLUMNS)]) == BASE_PRICE_COLUMNS
+        if fixed_layout:
+            headers = headers[:len(BASE_PRICE_COLUMNS)]
+
+        # Istniejące ceny wczytane jednym zapytaniem:
+        # (material_id, powierzchnia, grubość, szerokość) -> id
+        existing_index: dict[tuple, int] = {}
+        for price_id, *key in self.db.query(
+            BasePrice.id,
+            BasePrice.material_id,
+            BasePrice.surface_finish,
+            BasePrice.thickness,
+            BasePrice.width,
+        ).order_by(BasePrice.id):
+            existing_index.setdefault(tuple(key), price_id)
+
+        row_number = 1
+        while True:
+            chunk = list(islice(rows, BATCH_SIZE))
+            if not chunk:
+                break
+            if fixed_layout:
+                chunk = [row[:len(BASE_PRICE_COLUMNS)] for row in chunk]
 
-        for idx, row in df.iterrows():
+            # Paczka jako DataFrame o kolumnach z nagłówka; dtype=object, żeby
+            # typ kolumny nie zależał od tego, jakie wiersze trafiły do paczki
+            df = _rows_to_frame(chunk, dtype=object).reindex(columns=range(len(headers)))
+            df.columns = headers
+            df.index = range(row_number, row_number + len(df))
+            row_number += len(chunk)
+
+            self._import_base_price_rows(df, existing_index)
+
+    def _import_base_price_rows(self, df: pd.DataFrame, existing_index: dict[tuple, int]):
+        """Import jednej paczki wierszy arkusza 'cennik baza'.
+
+        Nowe pozycje są wstawiane, a ich id dopisywane do existing_index -
+        duplikat w dalszej części pliku zmienia już wstawioną cenę.
+        """
+        # Dostęp kolumnowy zamiast iterrows - bez tworzenia Series dla każdego wiersza.
+        # Kolumny tekstowe przycięte raz dla całej kolumny (puste komórki to "nan")
+        def text_column(name):
+            if name in df.columns:
+                return df[name].astype(str).str.strip().fillna("nan").tolist()
+            return [""] * len(df)
+
+        # Kolumny liczbowe przeliczone raz przez pd.to_numeric; surowe wartości
+        # zostają do zgłoszenia błędnej komórki
+        def numeric_column(name, default):
+            if name in df.columns:
+                numbers = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+                return numbers.tolist(), df[name].to_numpy()
+            return [default] * len(df), [default] * len(df)
+
+        # Funkcje wołane w pętli dla każdego wiersza - jako zmienne lokalne
+        isnan = math.isnan
+        notna = pd.notna
+
+        def to_float(column, i):
+            numbers, raw = column
+            value = numbers[i]
+            if isnan(value) and notna(raw[i]):
+                # Komórka nieliczbowa - float() zgłasza ten sam błąd co dotąd
+                return float(raw[i])
+            return value
+
+        row_labels = df.index.to_numpy()
+        grades = text_column("Gatunek")
+        surfaces = text_column("powierzchnia")
+        thicknesses = numeric_column("grubość", 0.0)
+        widths = numeric_column("szerokość", 0.0)
+        lengths = numeric_column("długość", 0.0)
+        base_prices = numeric_column("z papierem", float("nan"))
+
+        # Nowe pozycje zbierane do wsadowego INSERT, zmiany cen do wsadowego
+        # UPDATE; klucz pozwala wykryć duplikaty w obrębie paczki
+        to_insert: dict[tuple, dict] = {}
+        to_update: dict[int, float] = {}
+
+        for i in range(len(df)):
             try:
-                grade = str(row.get("Gatunek", "")).strip()
+                grade = grades[i]
                 if not grade or grade == "nan":
                     continue
 
                 material = self._get_or_create_material(grade)
 
-                surface = str(row.get("powierzchnia", "")).strip()
-                thickness = float(row.get("grubość", 0))
-                width = float(row.get("szerokość", 0))
-                length = float(row.get("długość", 0))
+                surface = surfaces[i]
+                thickness = to_float(thicknesses, i)
+                width = to_float(widths, i)
+                length = to_float(lengths, i)
 
                 # Cena bazowa "z papierem"
-                base_price_value = row.get("z papierem")
-                if pd.notna(base_price_value):
+                base_price_value = to_float(base_prices, i)
+                if not isnan(base_price_value):
+                    key = (material.id, surface, thickness, width)
+
                     # Sprawdź czy pozycja już istnieje
-                    existing = self.db.query(BasePrice).filter(
-                        BasePrice.material_id == material.id,
-                        BasePrice.surface_finish == surface,
-                        BasePrice.thickness == thickness,
-                        BasePrice.width == width,
-                    ).first()
-
-                    if existing:
-                        existing.price_pln_per_kg = float(base_price_value)
+                    existing_id = existing_index.get(key)
+
+                    if existing_id:
+                        to_update[existing_id] = base_price_value
+                    elif key in to_insert:
+                        to_insert[key]["price_pln_per_kg"] = base_price_value
                     else:
-                        bp = BasePrice(
-                            material_id=material.id,
-                            surface_finish=surface,
-                            thickness=thickness,
-                            width=width,
-                            length=length,
-                            price_pln_per_kg=float(base_price_value),
-                        )
-                        self.db.add(bp)
-                        self.result.base_prices_imported += 1
+                        to_insert[key] = {
+                            "material_id": material.id,
+                            "surface_finish": surface,
+                            "thickness": thickness,
+                            "width": width,
+                            "length": length,
+                            "price_pln_per_kg": base_price_value,
+                        }
 
             except Exception as e:
                 self.result.warnings.append(
-                    f"Wiersz {idx}: {str(e)}"
+                    f"Wiersz {row_labels[i]}: {str(e)}"
                 )
 
-    def _import_modifiers(self, df: pd.DataFrame, sheet_name: str):
+        if to_insert:
+            inserted_ids = self.db.scalars(
+                insert(BasePrice).returning(BasePrice.id, sort_by_parameter_order=True),
+                list(to_insert.values()),
+            ).all()
+            existing_index.update(zip(to_insert, inserted_ids))
+            self.result.base_prices_imported += len(inserted_ids)
+        if to_update:
+            self.db.execute(
+                update(BasePrice),
+                [{"id": price_id, "price_pln_per_kg": price} for price_id, price in to_update.items()],
+            )
+
+    def _import_modifiers(self, rows: Iterable[list], sheet_name: str):
         """Import modyfikatorów cen z arkusza 'DANE DO WPROWADZENIA'.
 
         Zawiera:
@@ -301,25 +601,30 @@ class ExcelImporter:
         - Dodatki za grubość dla różnych kombinacji
         - Kurs EUR
         """
+        df = _rows_to_frame(list(rows))
+
         # Ten arkusz ma złożoną strukturę - dane w różnych sekcjach
-        # Parsuj kurs EUR
-        for idx, row in df.iterrows():
-            for col_idx, val in enumerate(row):
-                if str(val).strip() == "KURS EURO":
-                    # Kurs w następnej kolumnie
-                    rate_val = row.iloc[col_idx + 1]
-                    if pd.notna(rate_val):
-                        rate = ExchangeRate(
-                            currency_from="EUR",
-                            currency_to="PLN",
-                            rate=float(rate_val),
-                        )
-                        self.db.add(rate)
-                        break
+        # Parsuj kurs EUR - etykiety szukane jednym porównaniem na całym arkuszu
+        cells = np.char.strip(df.to_numpy().astype(str))
+        rate_rows = set()
+        for row_idx, col_idx in np.argwhere(cells == "KURS EURO"):
+            # Najwyżej jeden kurs z wiersza
+            if row_idx in rate_rows:
+                continue
+            # Kurs w następnej kolumnie
+            rate_val = df.iat[row_idx, col_idx + 1]
+            if pd.notna(rate_val):
+                rate = ExchangeRate(
+                    currency_from="EUR",
+                    currency_to="PLN",
+                    rate=float(rate_val),
+                )
+                self.db.add(rate)
+                rate_rows.add(row_idx)
 
         self.result.modifiers_imported += 1
 
-    def _import_grinding_prices(self, df: pd.DataFrame, sheet_name: str):
+    def _import_grinding_prices(self, rows: Iterable[list], sheet_name: str):
         """Import cennika szlifowania z arkusza 'DANE SZLIF'.
 
         Struktura:
@@ -327,11 +632,22 @@ class ExcelImporter:
         - BABCIA: te same kolumny
         - BORYS: x1000/1250/1500, x2000
         """
+        df = _rows_to_frame(list(rows))
         current_provider = None
         grit_columns = {}
+        to_insert = []
+
+        # Grubości (pierwsza kolumna) i ceny przeliczone raz dla całego arkusza;
+        # listy floatów i math.isnan są w pętli tańsze niż skalary NumPy
+        numbers = _non_negative_numbers(df).tolist()
+        isnan = math.isnan
+        first_vals = (
+            df.iloc[:, 0].astype(str).str.strip().fillna("nan").tolist() if len(df.columns) else []
+        )
 
-        for idx, row in df.iterrows():
-            first_val = str(row.iloc[0]).strip()
+        # Jeden przebieg po wierszach arkusza (bez iterrows)
+        for row_idx, row in enumerate(df.to_numpy()):
+            first_val = first_vals[row_idx]
 
             # Wykryj sekcję dostawcy
             if first_val in ["CAMU", "BABCIA", "COSTA"]:
@@ -342,104 +658,64 @@ class ExcelImporter:
             if first_val == "" or first_val == "nan":
                 # Sprawdź czy to wiersz nagłówkowy
                 if any("K320" in str(v) or "K240" in str(v) for v in row if pd.notna(v)):
-                    grit_columns = {}
+                    header = {}
                     for col_idx, val in enumerate(row):
                         val_str = str(val).strip()
                         if val_str and val_str != "nan":
-                            grit_columns[col_idx] = val_str
+                            header[col_idx] = val_str
+                    # col_idx -> (granulacja, z SB)
+                    grit_columns = dict(zip(header, _classify_grit_columns(list(header.values()))))
                 continue
 
-            # Parsuj BORYS osobno (inna struktura)
+            # BORYS ma inną strukturę (osobne kolumny po prawej stronie:
+            # grubość | cena x1000/1250/1500 | cena x2000) - jeszcze nieobsługiwany
             if "BORYS" in first_val:
-                # BORYS ma inną strukturę - parsuj z osobnych kolumn
                 continue
 
             # Parsuj ceny dla grubości
-            if current_provider and first_val.replace(".", "").isdigit():
-                thickness = float(first_val)
-
-                for col_idx, grit_name in grit_columns.items():
-                    price_val = row.iloc[col_idx]
-                    if pd.notna(price_val) and str(price_val).replace(".", "").isdigit():
-                        with_sb = "+SB" in grit_name or grit_name == "SB [zł/kg]"
-                        grit = None
-                        if "K320" in grit_name or "K400" in grit_name:
-                            grit = "K320/K400"
-                        elif "K240" in grit_name or "K180" in grit_name:
-                            grit = "K240/K180"
-                        elif "K80" in grit_name or "K120" in grit_name:
-                            grit = "K80/K120"
-
-                        gp = GrindingPrice(
-                            provider=current_provider,
-                            grit=grit,
-                            thickness=thickness,
-                            price_pln_per_kg=float(price_val),
-                            with_sb=with_sb,
-                        )
-                        self.db.add(gp)
-                        self.result.grinding_prices_imported += 1
+            row_numbers = numbers[row_idx]
+            thickness = row_numbers[0]
+            if current_provider and not isnan(thickness):
+                for col_idx, (grit, with_sb) in grit_columns.items():
+                    price = row_numbers[col_idx]
+                    if not isnan(price):
+                        to_insert.append({
+                            "provider": current_provider,
+                            "grit": grit,
+                            "thickness": thickness,
+                            "price_pln_per_kg": price,
+                            "with_sb": with_sb,
+                        })
 
-        # Parsuj BORYS (osobne kolumny po prawej stronie)
-        for idx, row in df.iterrows():
-            # Szukaj kolumny BORYS
-            for col_idx, val in enumerate(row):
-                if "BORYS" in str(val):
-                    # Parsuj dane BORYS
-                    # Struktura: grubość | cena x1000/1250/1500 | cena x2000
-                    pass
+        self._execute_batched(insert(GrindingPrice), to_insert)
+        self.result.grinding_prices_imported += len(to_insert)
 
-    def _import_film_prices(self, df: pd.DataFrame, sheet_name: str):
+    def _import_film_prices(self, rows: Iterable[list], sheet_name: str):
         """Import cennika folii z arkusza 'DANE FOLIA'.
 
         Kolumny: grubość, Novacel 4228, FOLIA FIBER, FOLIA ZWYKŁA,
                  Nitto 3100, Nitto 3067M, NITTO AFP585, NITTO 224PR
         """
+        df = _rows_to_frame(list(rows))
+
         # Znajdź wiersz nagłówkowy
-        header_row = None
-        for idx, row in df.iterrows():
-            if any("Novacel" in str(v) or "FOLIA" in str(v) or "Nitto" in str(v)
-                   for v in row if pd.notna(v)):
-                header_row = idx
-                break
+        header_row = _film_header_row(df)
 
         if header_row is None:
             self.result.warnings.append("Nie znaleziono nagłówków folii")
             return
 
-        # Pobierz nagłówki
-        headers = {}
-        for col_idx, val in enumerate(df.iloc[header_row]):
-            val_str = str(val).strip()
-            if val_str in EXCEL_FILM_MAPPING:
-                headers[col_idx] = EXCEL_FILM_MAPPING[val_str]
-
         # Parsuj ceny
-        for idx in range(header_row + 1, len(df)):
-            row = df.iloc[idx]
-            thickness_val = row.iloc[0]
-
-            if pd.isna(thickness_val):
-                continue
-
-            try:
-                thickness = float(thickness_val)
-            except (ValueError, TypeError):
-                continue
+        to_insert = []
+        for _, film_type, thickness, price in _film_prices(df, header_row):
+            to_insert.append({
+                "film_type": film_type,
+                "thickness": thickness,
+                "price_pln_per_kg": price,
+            })
+            self.result.film_prices_imported += 1
 
-            for col_idx, film_type in headers.items():
-                price_val = row.iloc[col_idx]
-                if pd.notna(price_val):
-                    try:
-                        fp = FilmPrice(
-                            film_type=film_type,
-                            thickness=thickness,
-                            price_pln_per_kg=float(price_val),
-                        )
-                        self.db.add(fp)
-                        self.result.film_prices_imported += 1
-                    except (ValueError, TypeError):
-                        pass
+        self._execute_batched(insert(FilmPrice), to_insert)
 
     def analyze_file(self, file_path: Path) -> ImportAnalysis:
         """Analizuj plik Excel i wygeneruj podglad zmian bez importowania.
@@ -459,8 +735,19 @@ class ExcelImporter:
             filename=file_path.name,
         )
 
-        xl = pd.ExcelFile(file_path)
-        sheet_names_lower = {name.lower(): name for name in xl.sheet_names}
+        # Skoroszyt otwierany raz dla wszystkich arkuszy
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            self._analyze_workbook(wb, analysis)
+        finally:
+            wb.close()
+
+        return analysis
+
+    def _analyze_workbook(self, wb: openpyxl.Workbook, analysis: ImportAnalysis):
+        """Analizuj arkusze otwartego skoroszytu."""
+        sheet_names = wb.sheetnames
+        sheet_names_lower = {name.lower(): name for name in sheet_names}
 
         # Znajdz arkusz cen bazowych (elastyczne dopasowanie)
         base_sheet = None
@@ -469,17 +756,17 @@ class ExcelImporter:
                 base_sheet = sheet_names_lower[pattern]
                 break
         # Sprawdz tez pierwszy arkusz jesli ma kolumne "Gatunek"
-        if not base_sheet and xl.sheet_names:
-            first_df = pd.read_excel(xl, sheet_name=xl.sheet_names[0], header=None, nrows=5)
+        if not base_sheet and sheet_names:
+            first_df = _rows_to_frame(list(islice(_iter_sheet_rows(wb[sheet_names[0]]), 5)))
             first_row = [str(v).lower() for v in first_df.iloc[0].tolist() if pd.notna(v)]
             if any("gatunek" in col for col in first_row):
-                base_sheet = xl.sheet_names[0]
+                base_sheet = sheet_names[0]
 
         if base_sheet:
-            df = pd.read_excel(xl, sheet_name=base_sheet, header=None)
+            df = _read_sheet(wb[base_sheet])
             self._analyze_base_prices(df, analysis)
         else:
-            analysis.warnings.append(f"Nie znaleziono arkusza cen bazowych. Dostepne: {xl.sheet_names}")
+            analysis.warnings.append(f"Nie znaleziono arkusza cen bazowych. Dostepne: {sheet_names}")
 
         # Znajdz arkusz szlifu
         grinding_sheet = None
@@ -489,7 +776,7 @@ class ExcelImporter:
                 break
 
         if grinding_sheet:
-            df = pd.read_excel(xl, sheet_name=grinding_sheet, header=None)
+            df = _read_sheet(wb[grinding_sheet])
             self._analyze_grinding_prices(df, analysis)
 
         # Znajdz arkusz folii
@@ -500,7 +787,7 @@ class ExcelImporter:
                 break
 
         if film_sheet:
-            df = pd.read_excel(xl, sheet_name=film_sheet, header=None)
+            df = _read_sheet(wb[film_sheet])
             self._analyze_film_prices(df, analysis)
 
         # Oblicz podsumowanie
@@ -510,9 +797,7 @@ class ExcelImporter:
 
         # Jesli nic nie znaleziono, dodaj info o dostepnych arkuszach
         if analysis.total_rows == 0:
-            analysis.warnings.append(f"Nie znaleziono danych do importu. Arkusze w pliku: {xl.sheet_names}")
-
-        return analysis
+            analysis.warnings.append(f"Nie znaleziono danych do importu. Arkusze w pliku: {sheet_names}")
 
     def _analyze_base_prices(self, df: pd.DataFrame, analysis: ImportAnalysis):
         """Analizuj ceny bazowe i wygeneruj diff."""
@@ -798,10 +1083,11 @@ class ExcelImporter:
         current_provider = None
         grit_columns = {}
         row_number = 0
+        numbers = _non_negative_numbers(df)
 
-        for idx, row in df.iterrows():
-            row_number = idx + 1
-            first_val = str(row.iloc[0]).strip()
+        for row_idx, row in enumerate(df.to_numpy()):
+            row_number = row_idx + 1
+            first_val = str(row[0]).strip()
 
             # Wykryj sekcje dostawcy
             if first_val in ["CAMU", "BABCIA", "COSTA"]:
@@ -814,30 +1100,22 @@ class ExcelImporter:
             # Naglowki kolumn z granulacjami
             if first_val == "" or first_val == "nan":
                 if any("K320" in str(v) or "K240" in str(v) for v in row if pd.notna(v)):
-                    grit_columns = {}
+                    header = {}
                     for col_idx, val in enumerate(row):
                         val_str = str(val).strip()
                         if val_str and val_str != "nan":
-                            grit_columns[col_idx] = val_str
+                            header[col_idx] = val_str
+                    grit_columns = dict(zip(header, _classify_grit_columns(list(header.values()))))
                 continue
 
             # Parsuj ceny dla grubosci
-            if current_provider and first_val.replace(".", "").isdigit():
-                thickness = float(first_val)
-
-                for col_idx, grit_name in grit_columns.items():
-                    price_val = row.iloc[col_idx]
-                    if pd.notna(price_val) and str(price_val).replace(".", "").isdigit():
-                        new_price = float(price_val)
-                        with_sb = "+SB" in grit_name or grit_name == "SB [zł/kg]"
-
-                        grit = None
-                        if "K320" in grit_name or "K400" in grit_name:
-                            grit = "K320/K400"
-                        elif "K240" in grit_name or "K180" in grit_name:
-                            grit = "K240/K180"
-                        elif "K80" in grit_name or "K120" in grit_name:
-                            grit = "K80/K120"
+            thickness = numbers[row_idx, 0]
+            if current_provider and not np.isnan(thickness):
+                thickness = float(thickness)
+
+                for col_idx, (grit, with_sb) in grit_columns.items():
+                    if not np.isnan(numbers[row_idx, col_idx]):
+                        new_price = float(numbers[row_idx, col_idx])
 
                         # Sprawdz istniejaca cene
                         existing = self.db.query(GrindingPrice).filter(
@@ -1006,91 +1284,61 @@ class ExcelImporter:
     def _analyze_film_original_format(self, df: pd.DataFrame, analysis: ImportAnalysis):
         """Analizuj cennik folii w oryginalnym formacie DANE FOLIA."""
         # Znajdz wiersz naglowkowy
-        header_row = None
-        for idx, row in df.iterrows():
-            if any("Novacel" in str(v) or "FOLIA" in str(v) or "Nitto" in str(v)
-                   for v in row if pd.notna(v)):
-                header_row = idx
-                break
+        header_row = _film_header_row(df)
 
         if header_row is None:
             analysis.warnings.append("Nie znaleziono naglowkow folii w oryginalnym formacie")
             return
 
-        # Pobierz naglowki
-        headers = {}
-        for col_idx, val in enumerate(df.iloc[header_row]):
-            val_str = str(val).strip()
-            if val_str in EXCEL_FILM_MAPPING:
-                headers[col_idx] = EXCEL_FILM_MAPPING[val_str]
-
         # Parsuj ceny
-        for idx in range(header_row + 1, len(df)):
-            row_number = idx + 1
-            row = df.iloc[idx]
-            thickness_val = row.iloc[0]
-
-            if pd.isna(thickness_val):
-                continue
-
-            try:
-                thickness = float(thickness_val)
-            except (ValueError, TypeError):
-                continue
-
-            for col_idx, film_type in headers.items():
-                price_val = row.iloc[col_idx]
-                if pd.notna(price_val):
-                    try:
-                        new_price = float(price_val)
+        for row_idx, film_type, thickness, new_price in _film_prices(df, header_row):
+            row_number = row_idx + 1
 
-                        # Sprawdz istniejaca cene
-                        existing = self.db.query(FilmPrice).filter(
-                            FilmPrice.film_type == film_type,
-                            FilmPrice.thickness == thickness,
-                        ).first()
+            # Sprawdz istniejaca cene
+            existing = self.db.query(FilmPrice).filter(
+                FilmPrice.film_type == film_type,
+                FilmPrice.thickness == thickness,
+            ).first()
 
-                        if existing:
-                            current_price = existing.price_pln_per_kg
-                            if abs(current_price - new_price) < 0.001:
-                                analysis.unchanged += 1
-                            else:
-                                analysis.items.append(ImportDiffItem(
-                                    row_number=row_number,
-                                    change_type="updated",
-                                    data_type="film",
-                                    film_type=film_type.value,
-                                    thickness=thickness,
-                                    current_price=current_price,
-                                    new_price=new_price,
-                                    price_change=new_price - current_price,
-                                ))
-                                analysis.updated += 1
-                                analysis.pending_changes.append({
-                                    "type": "film",
-                                    "action": "update",
-                                    "id": existing.id,
-                                    "price": new_price,
-                                })
-                        else:
-                            analysis.items.append(ImportDiffItem(
-                                row_number=row_number,
-                                change_type="added",
-                                data_type="film",
-                                film_type=film_type.value,
-                                thickness=thickness,
-                                new_price=new_price,
-                            ))
-                            analysis.added += 1
-                            analysis.pending_changes.append({
-                                "type": "film",
-                                "action": "add",
-                                "film_type": film_type.value,
-                                "thickness": thickness,
-                                "price": new_price,
-                            })
-                    except (ValueError, TypeError):
-                        pass
+            if existing:
+                current_price = existing.price_pln_per_kg
+                if abs(current_price - new_price) < 0.001:
+                    analysis.unchanged += 1
+                else:
+                    analysis.items.append(ImportDiffItem(
+                        row_number=row_number,
+                        change_type="updated",
+                        data_type="film",
+                        film_type=film_type.value,
+                        thickness=thickness,
+                        current_price=current_price,
+                        new_price=new_price,
+                        price_change=new_price - current_price,
+                    ))
+                    analysis.updated += 1
+                    analysis.pending_changes.append({
+                        "type": "film",
+                        "action": "update",
+                        "id": existing.id,
+                        "price": new_price,
+                    })
+            else:
+                analysis.items.append(ImportDiffItem(
+                    row_number=row_number,
+                    change_type="added",
+                    data_type="film",
+                    film_type=film_type.value,
+                    thickness=thickness,
+                    new_price=new_price,
+                ))
+                analysis.added += 1
+                analysis.pending_changes.append({
+                    "type": "film",
+                    "action": "add",
+                    "film_type": film_type.value,
+                    "thickness": thickness,
+                    "price": new_price,
+                })
 
     def apply_import(self, analysis: ImportAnalysis, mode: str = "update_existing") -> ImportResult:
         """Zastosuj zmiany z analizy.
@@ -1185,9 +1433,11 @@ class ExcelImporter:
                 result.success = False
 
         self.db.commit()
+        invalidate_grinding_matrices()
+        invalidate_price_lookups()
         return result
 
-    def import_materials_from_config(self, config: list[dict]) -> int:
+    def import_materials_from_config(self, config: Iterable[dict]) -> int:
         """Import materiałów z konfiguracji.
 
         Przykład config:
@@ -1205,30 +1455,31 @@ class ExcelImporter:
         if not self.db:
             raise ValueError("Brak połączenia z bazą danych")
 
-        count = 0
-        for item in config:
-            existing = self.db.query(Material).filter(
-                Material.grade == item["grade"]
-            ).first()
+        # Istniejące gatunki jednym zapytaniem zamiast SELECT na każdą pozycję
+        existing_grades = {grade for (grade,) in self.db.query(Material.grade)}
 
-            if not existing:
-                material = Material(
-                    name=item["name"],
-                    grade=item["grade"],
-                    category=MaterialCategory(item["category"]),
-                    density=item.get("density", 7.9),
-                    equivalent_grades=item.get("equivalent_grades"),
-                    description=item.get("description"),
-                )
-                self.db.add(material)
-                count += 1
+        to_insert = []
+        for item in config:
+            if item["grade"] in existing_grades:
+                continue
+            existing_grades.add(item["grade"])
+            to_insert.append({
+                "name": item["name"],
+                "grade": item["grade"],
+                "category": MaterialCategory(item["category"]),
+                "density": item.get("density", 7.9),
+                "equivalent_grades": item.get("equivalent_grades"),
+                "description": item.get("description"),
+            })
 
+        self._execute_batched(insert(Material), to_insert)
         self.db.commit()
-        return count
+        self._material_by_grade = None
+        return len(to_insert)
 
 
-# Predefiniowane konfiguracje materiałów
-STAINLESS_STEEL_GRADES = [
+# Predefiniowane konfiguracje materiałów (krotki - współdzielone stałe modułu)
+STAINLESS_STEEL_GRADES = (
     {
         "grade": "1.4301",
         "name": "Stal nierdzewna 304",
@@ -1253,9 +1504,9 @@ STAINLESS_STEEL_GRADES = [
         "equivalent_grades": "AISI 430, X6Cr17",
         "description": "Ferrytyczna stal nierdzewna, magnetyczna, ekonomiczna",
     },
-]
+)
 
-CARBON_STEEL_GRADES = [
+CARBON_STEEL_GRADES = (
     {
         "grade": "DC01",
         "name": "Stal czarna DC01",
@@ -1280,9 +1531,9 @@ CARBON_STEEL_GRADES = [
         "equivalent_grades": "1.0045, St52-3",
         "description": "Stal konstrukcyjna o podwyższonej wytrzymałości",
     },
-]
+)
 
-ALUMINUM_GRADES = [
+ALUMINUM_GRADES = (
     {
         "grade": "1050",
         "name": "Aluminium 1050",
@@ -1307,6 +1558,6 @@ ALUMINUM_GRADES = [
         "equivalent_grades": "AlMg1SiCu",
         "description": "Stop Al-Mg-Si, wszechstronny, utwardzalny",
     },
-]
+)
 
 ALL_MATERIAL_GRADES = STAINLESS_STEEL_GRADES + CARBON_STEEL_GRADES + ALUMINUM_GRADES
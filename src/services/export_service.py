@@ -1,13 +1,20 @@
 """Serwis do eksportu danych cennikowych do Excel/CSV."""
 
+import csv
 from datetime import datetime
-from io import BytesIO
-from typing import Optional
+from io import StringIO
+from itertools import groupby
+from operator import attrgetter
+from tempfile import SpooledTemporaryFile
+from types import MappingProxyType
+from typing import IO, Iterable, Iterator, Optional
 
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Float, String, literal, null, select, union_all
+from sqlalchemy.orm import Session
 
 from ..models import (
     Material,
@@ -22,6 +29,30 @@ from ..models import (
 )
 
 
+# Liczba wierszy pobieranych z bazy na raz - zapytania eksportu sa
+# strumieniowane, zamiast ladowac wszystkie obiekty do listy
+EXPORT_YIELD_PER = 1000
+
+# Rozmiar pliku eksportu trzymanego w pamieci - wiekszy trafia na dysk
+EXPORT_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Teksty enumow i etykiety "Z SB" wyliczone raz - bez .value i warunku
+# dla kazdego eksportowanego wiersza
+_SB_LABEL = ("Nie", "Tak")
+_CATEGORY_STR = {c: c.value for c in MaterialCategory}
+_PROVIDER_STR = {p: p.value for p in GrindingProvider}
+_FILM_STR = {f: f.value for f in FilmType}
+
+# Przedrostki nazw plikow eksportu wg typu danych
+_TYPE_NAMES = MappingProxyType({
+    "base_prices": "ceny_bazowe",
+    "grinding": "cennik_szlifu",
+    "film": "cennik_folii",
+    "modifiers": "modyfikatory",
+    "all": "cennik_pelny",
+})
+
+
 class PriceExporter:
     """Eksporter danych cennikowych do Excel/CSV."""
 
@@ -36,6 +67,29 @@ class PriceExporter:
     )
     CENTER_ALIGN = Alignment(horizontal="center", vertical="center")
 
+    # Naglowki arkuszy ze stalymi szerokosciami kolumn - arkusz w trybie
+    # write_only nie pozwala dopasowac szerokosci po zapisaniu wierszy
+    BASE_PRICE_HEADERS = [
+        ("Gatunek", 12), ("Nazwa materialu", 30), ("Kategoria", 18), ("Wykoncznie", 14),
+        ("Grubosc (mm)", 14), ("Szerokosc (mm)", 16), ("Dlugosc (mm)", 14), ("Cena PLN/kg", 14),
+        ("Uwagi", 40),
+    ]
+    GRINDING_HEADERS = [
+        ("Dostawca", 12), ("Granulacja", 14), ("Grubosc (mm)", 14), ("Cena PLN/kg", 14),
+        ("Z SB", 8), ("Wariant szerokosci", 20),
+    ]
+    FILM_HEADERS = [("Typ folii", 18), ("Grubosc (mm)", 14), ("Cena PLN/kg", 14)]
+    THICKNESS_MODIFIER_HEADERS = [
+        ("Gatunek", 12), ("Wykoncznie", 14), ("Szerokosc bazowa", 18), ("Grubosc (mm)", 14),
+        ("Modyfikator PLN/kg", 20),
+    ]
+    WIDTH_MODIFIER_HEADERS = [("Gatunek", 14), ("Szerokosc (mm)", 16), ("Modyfikator PLN/kg", 20)]
+
+    # Kolumny numeryczne (numeracja od 1) wysrodkowane w arkuszach
+    BASE_PRICE_CENTER_COLS = (5, 6, 7, 8)
+    GRINDING_CENTER_COLS = (3, 4)
+    FILM_CENTER_COLS = (2, 3)
+
     def __init__(self, db: Session):
         self.db = db
 
@@ -48,7 +102,7 @@ class PriceExporter:
         width_max: Optional[float] = None,
         surface_finishes: Optional[list[str]] = None,
         only_active: bool = True,
-    ) -> bytes:
+    ) -> IO[bytes]:
         """Eksportuj ceny bazowe do Excel.
 
         Args:
@@ -61,77 +115,23 @@ class PriceExporter:
             only_active: Tylko aktywne ceny
 
         Returns:
-            bytes: Zawartosc pliku Excel
+            IO[bytes]: Plik Excel ustawiony na poczatek
         """
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Ceny bazowe"
-
-        # Naglowki
-        headers = [
-            "Gatunek", "Nazwa materialu", "Kategoria", "Wykoncznie",
-            "Grubosc (mm)", "Szerokosc (mm)", "Dlugosc (mm)", "Cena PLN/kg", "Uwagi"
-        ]
-        self._write_headers(ws, headers)
-
-        # Pobierz dane
-        query = self.db.query(BasePrice).options(joinedload(BasePrice.material))
-
-        if only_active:
-            query = query.filter(BasePrice.is_active == True)
-
-        if categories:
-            category_enums = [MaterialCategory(c) for c in categories]
-            query = query.join(Material).filter(Material.category.in_(category_enums))
-
-        if thickness_min is not None:
-            query = query.filter(BasePrice.thickness >= thickness_min)
-        if thickness_max is not None:
-            query = query.filter(BasePrice.thickness <= thickness_max)
-
-        if width_min is not None:
-            query = query.filter(BasePrice.width >= width_min)
-        if width_max is not None:
-            query = query.filter(BasePrice.width <= width_max)
-
-        if surface_finishes:
-            query = query.filter(BasePrice.surface_finish.in_(surface_finishes))
-
-        prices = query.order_by(
-            BasePrice.material_id,
-            BasePrice.surface_finish,
-            BasePrice.thickness,
-            BasePrice.width
-        ).all()
-
-        # Zapisz dane
-        for row_idx, price in enumerate(prices, start=2):
-            material = price.material
-            ws.cell(row=row_idx, column=1, value=material.grade)
-            ws.cell(row=row_idx, column=2, value=material.name)
-            ws.cell(row=row_idx, column=3, value=material.category.value)
-            ws.cell(row=row_idx, column=4, value=price.surface_finish)
-            ws.cell(row=row_idx, column=5, value=price.thickness)
-            ws.cell(row=row_idx, column=6, value=price.width)
-            ws.cell(row=row_idx, column=7, value=price.length)
-            ws.cell(row=row_idx, column=8, value=price.price_pln_per_kg)
-            ws.cell(row=row_idx, column=9, value=price.notes or "")
-
-            # Formatowanie
-            for col in range(1, 10):
-                cell = ws.cell(row=row_idx, column=col)
-                cell.border = self.BORDER
-                if col in [5, 6, 7, 8]:  # Kolumny numeryczne
-                    cell.alignment = self.CENTER_ALIGN
-
-        # Autofit kolumn
-        self._autofit_columns(ws)
-
-        # Zapisz do BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output.read()
+        wb = self._new_workbook()
+        self._write_sheet(
+            wb, "Ceny bazowe", self.BASE_PRICE_HEADERS,
+            self._iter_base_price_rows(
+                categories=categories,
+                thickness_min=thickness_min,
+                thickness_max=thickness_max,
+                width_min=width_min,
+                width_max=width_max,
+                surface_finishes=surface_finishes,
+                only_active=only_active,
+            ),
+            center_cols=self.BASE_PRICE_CENTER_COLS,
+        )
+        return self._save(wb)
 
     def export_grinding_prices(
         self,
@@ -139,7 +139,7 @@ class PriceExporter:
         thickness_min: Optional[float] = None,
         thickness_max: Optional[float] = None,
         only_active: bool = True,
-    ) -> bytes:
+    ) -> IO[bytes]:
         """Eksportuj ceny szlifowania do Excel.
 
         Args:
@@ -149,61 +149,20 @@ class PriceExporter:
             only_active: Tylko aktywne ceny
 
         Returns:
-            bytes: Zawartosc pliku Excel
+            IO[bytes]: Plik Excel ustawiony na poczatek
         """
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Cennik szlifu"
-
-        # Naglowki
-        headers = [
-            "Dostawca", "Granulacja", "Grubosc (mm)", "Cena PLN/kg", "Z SB", "Wariant szerokosci"
-        ]
-        self._write_headers(ws, headers)
-
-        # Pobierz dane
-        query = self.db.query(GrindingPrice)
-
-        if only_active:
-            query = query.filter(GrindingPrice.is_active == True)
-
-        if providers:
-            provider_enums = [GrindingProvider(p) for p in providers]
-            query = query.filter(GrindingPrice.provider.in_(provider_enums))
-
-        if thickness_min is not None:
-            query = query.filter(GrindingPrice.thickness >= thickness_min)
-        if thickness_max is not None:
-            query = query.filter(GrindingPrice.thickness <= thickness_max)
-
-        prices = query.order_by(
-            GrindingPrice.provider,
-            GrindingPrice.grit,
-            GrindingPrice.thickness
-        ).all()
-
-        # Zapisz dane
-        for row_idx, price in enumerate(prices, start=2):
-            ws.cell(row=row_idx, column=1, value=price.provider.value)
-            ws.cell(row=row_idx, column=2, value=price.grit)
-            ws.cell(row=row_idx, column=3, value=price.thickness)
-            ws.cell(row=row_idx, column=4, value=price.price_pln_per_kg)
-            ws.cell(row=row_idx, column=5, value="Tak" if price.with_sb else "Nie")
-            ws.cell(row=row_idx, column=6, value=price.width_variant or "")
-
-            # Formatowanie
-            for col in range(1, 7):
-                cell = ws.cell(row=row_idx, column=col)
-                cell.border = self.BORDER
-                if col in [3, 4]:
-                    cell.alignment = self.CENTER_ALIGN
-
-        self._autofit_columns(ws)
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output.read()
+        wb = self._new_workbook()
+        self._write_sheet(
+            wb, "Cennik szlifu", self.GRINDING_HEADERS,
+            self._iter_grinding_rows(
+                providers=providers,
+                thickness_min=thickness_min,
+                thickness_max=thickness_max,
+                only_active=only_active,
+            ),
+            center_cols=self.GRINDING_CENTER_COLS,
+        )
+        return self._save(wb)
 
     def export_film_prices(
         self,
@@ -211,7 +170,7 @@ class PriceExporter:
         thickness_min: Optional[float] = None,
         thickness_max: Optional[float] = None,
         only_active: bool = True,
-    ) -> bytes:
+    ) -> IO[bytes]:
         """Eksportuj ceny folii do Excel.
 
         Args:
@@ -221,115 +180,30 @@ class PriceExporter:
             only_active: Tylko aktywne ceny
 
         Returns:
-            bytes: Zawartosc pliku Excel
+            IO[bytes]: Plik Excel ustawiony na poczatek
         """
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Cennik folii"
-
-        # Naglowki
-        headers = ["Typ folii", "Grubosc (mm)", "Cena PLN/kg"]
-        self._write_headers(ws, headers)
-
-        # Pobierz dane
-        query = self.db.query(FilmPrice)
-
-        if only_active:
-            query = query.filter(FilmPrice.is_active == True)
-
-        if film_types:
-            type_enums = [FilmType(t) for t in film_types]
-            query = query.filter(FilmPrice.film_type.in_(type_enums))
-
-        if thickness_min is not None:
-            query = query.filter(FilmPrice.thickness >= thickness_min)
-        if thickness_max is not None:
-            query = query.filter(FilmPrice.thickness <= thickness_max)
-
-        prices = query.order_by(
-            FilmPrice.film_type,
-            FilmPrice.thickness
-        ).all()
-
-        # Zapisz dane
-        for row_idx, price in enumerate(prices, start=2):
-            ws.cell(row=row_idx, column=1, value=price.film_type.value)
-            ws.cell(row=row_idx, column=2, value=price.thickness)
-            ws.cell(row=row_idx, column=3, value=price.price_pln_per_kg)
-
-            for col in range(1, 4):
-                cell = ws.cell(row=row_idx, column=col)
-                cell.border = self.BORDER
-                if col in [2, 3]:
-                    cell.alignment = self.CENTER_ALIGN
-
-        self._autofit_columns(ws)
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output.read()
-
-    def export_modifiers(self) -> bytes:
+        wb = self._new_workbook()
+        self._write_sheet(
+            wb, "Cennik folii", self.FILM_HEADERS,
+            self._iter_film_rows(
+                film_types=film_types,
+                thickness_min=thickness_min,
+                thickness_max=thickness_max,
+                only_active=only_active,
+            ),
+            center_cols=self.FILM_CENTER_COLS,
+        )
+        return self._save(wb)
+
+    def export_modifiers(self) -> IO[bytes]:
         """Eksportuj modyfikatory cen do Excel.
 
         Returns:
-            bytes: Zawartosc pliku Excel
+            IO[bytes]: Plik Excel ustawiony na poczatek
         """
-        wb = Workbook()
-
-        # Arkusz 1: Modyfikatory grubosci
-        ws1 = wb.active
-        ws1.title = "Modyfikatory grubosci"
-
-        headers = ["Gatunek", "Wykoncznie", "Szerokosc bazowa", "Grubosc (mm)", "Modyfikator PLN/kg"]
-        self._write_headers(ws1, headers)
-
-        thickness_mods = self.db.query(ThicknessModifier).order_by(
-            ThicknessModifier.grade,
-            ThicknessModifier.surface_finish,
-            ThicknessModifier.thickness
-        ).all()
-
-        for row_idx, mod in enumerate(thickness_mods, start=2):
-            ws1.cell(row=row_idx, column=1, value=mod.grade)
-            ws1.cell(row=row_idx, column=2, value=mod.surface_finish)
-            ws1.cell(row=row_idx, column=3, value=mod.base_width)
-            ws1.cell(row=row_idx, column=4, value=mod.thickness)
-            ws1.cell(row=row_idx, column=5, value=mod.price_modifier)
-
-            for col in range(1, 6):
-                cell = ws1.cell(row=row_idx, column=col)
-                cell.border = self.BORDER
-
-        self._autofit_columns(ws1)
-
-        # Arkusz 2: Modyfikatory szerokosci
-        ws2 = wb.create_sheet("Modyfikatory szerokosci")
-
-        headers = ["Gatunek", "Szerokosc (mm)", "Modyfikator PLN/kg"]
-        self._write_headers(ws2, headers)
-
-        width_mods = self.db.query(WidthModifier).order_by(
-            WidthModifier.grade,
-            WidthModifier.width
-        ).all()
-
-        for row_idx, mod in enumerate(width_mods, start=2):
-            ws2.cell(row=row_idx, column=1, value=mod.grade or "(wszystkie)")
-            ws2.cell(row=row_idx, column=2, value=mod.width)
-            ws2.cell(row=row_idx, column=3, value=mod.price_modifier)
-
-            for col in range(1, 4):
-                cell = ws2.cell(row=row_idx, column=col)
-                cell.border = self.BORDER
-
-        self._autofit_columns(ws2)
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output.read()
+        wb = self._new_workbook()
+        self._write_modifier_sheets(wb)
+        return self._save(wb)
 
     def export_all(
         self,
@@ -338,9 +212,12 @@ class PriceExporter:
         thickness_max: Optional[float] = None,
         surface_finishes: Optional[list[str]] = None,
         only_active: bool = True,
-    ) -> bytes:
+    ) -> IO[bytes]:
         """Eksportuj wszystkie ceny do wieloarkuszowego Excela.
 
+        Arkusze powstaja z tych samych generatorow wierszy co eksporty
+        pojedyncze - kazdy zbior danych jest czytany raz i od razu zapisywany.
+
         Args:
             categories: Lista kategorii materialow
             thickness_min: Minimalna grubosc
@@ -349,164 +226,49 @@ class PriceExporter:
             only_active: Tylko aktywne ceny
 
         Returns:
-            bytes: Zawartosc pliku Excel
+            IO[bytes]: Plik Excel ustawiony na poczatek
         """
-        wb = Workbook()
+        wb = self._new_workbook()
 
         # === Arkusz 1: Ceny bazowe ===
-        ws1 = wb.active
-        ws1.title = "Ceny bazowe"
-
-        headers = [
-            "Gatunek", "Nazwa materialu", "Kategoria", "Wykoncznie",
-            "Grubosc (mm)", "Szerokosc (mm)", "Dlugosc (mm)", "Cena PLN/kg", "Uwagi"
-        ]
-        self._write_headers(ws1, headers)
-
-        query = self.db.query(BasePrice).options(joinedload(BasePrice.material))
-
-        if only_active:
-            query = query.filter(BasePrice.is_active == True)
-
-        if categories:
-            category_enums = [MaterialCategory(c) for c in categories]
-            query = query.join(Material).filter(Material.category.in_(category_enums))
-
-        if thickness_min is not None:
-            query = query.filter(BasePrice.thickness >= thickness_min)
-        if thickness_max is not None:
-            query = query.filter(BasePrice.thickness <= thickness_max)
-
-        if surface_finishes:
-            query = query.filter(BasePrice.surface_finish.in_(surface_finishes))
-
-        prices = query.order_by(
-            BasePrice.material_id, BasePrice.surface_finish,
-            BasePrice.thickness, BasePrice.width
-        ).all()
-
-        for row_idx, price in enumerate(prices, start=2):
-            material = price.material
-            ws1.cell(row=row_idx, column=1, value=material.grade)
-            ws1.cell(row=row_idx, column=2, value=material.name)
-            ws1.cell(row=row_idx, column=3, value=material.category.value)
-            ws1.cell(row=row_idx, column=4, value=price.surface_finish)
-            ws1.cell(row=row_idx, column=5, value=price.thickness)
-            ws1.cell(row=row_idx, column=6, value=price.width)
-            ws1.cell(row=row_idx, column=7, value=price.length)
-            ws1.cell(row=row_idx, column=8, value=price.price_pln_per_kg)
-            ws1.cell(row=row_idx, column=9, value=price.notes or "")
-
-            for col in range(1, 10):
-                cell = ws1.cell(row=row_idx, column=col)
-                cell.border = self.BORDER
-
-        self._autofit_columns(ws1)
+        self._write_sheet(
+            wb, "Ceny bazowe", self.BASE_PRICE_HEADERS,
+            self._iter_base_price_rows(
+                categories=categories,
+                thickness_min=thickness_min,
+                thickness_max=thickness_max,
+                surface_finishes=surface_finishes,
+                only_active=only_active,
+            ),
+            center_cols=self.BASE_PRICE_CENTER_COLS,
+        )
 
         # === Arkusz 2: Cennik szlifu ===
-        ws2 = wb.create_sheet("Cennik szlifu")
-
-        headers = ["Dostawca", "Granulacja", "Grubosc (mm)", "Cena PLN/kg", "Z SB", "Wariant szerokosci"]
-        self._write_headers(ws2, headers)
-
-        grinding_query = self.db.query(GrindingPrice)
-        if only_active:
-            grinding_query = grinding_query.filter(GrindingPrice.is_active == True)
-
-        if thickness_min is not None:
-            grinding_query = grinding_query.filter(GrindingPrice.thickness >= thickness_min)
-        if thickness_max is not None:
-            grinding_query = grinding_query.filter(GrindingPrice.thickness <= thickness_max)
-
-        grinding_prices = grinding_query.order_by(
-            GrindingPrice.provider, GrindingPrice.grit, GrindingPrice.thickness
-        ).all()
-
-        for row_idx, price in enumerate(grinding_prices, start=2):
-            ws2.cell(row=row_idx, column=1, value=price.provider.value)
-            ws2.cell(row=row_idx, column=2, value=price.grit)
-            ws2.cell(row=row_idx, column=3, value=price.thickness)
-            ws2.cell(row=row_idx, column=4, value=price.price_pln_per_kg)
-            ws2.cell(row=row_idx, column=5, value="Tak" if price.with_sb else "Nie")
-            ws2.cell(row=row_idx, column=6, value=price.width_variant or "")
-
-            for col in range(1, 7):
-                ws2.cell(row=row_idx, column=col).border = self.BORDER
-
-        self._autofit_columns(ws2)
+        self._write_sheet(
+            wb, "Cennik szlifu", self.GRINDING_HEADERS,
+            self._iter_grinding_rows(
+                thickness_min=thickness_min,
+                thickness_max=thickness_max,
+                only_active=only_active,
+            ),
+            center_cols=self.GRINDING_CENTER_COLS,
+        )
 
         # === Arkusz 3: Cennik folii ===
-        ws3 = wb.create_sheet("Cennik folii")
-
-        headers = ["Typ folii", "Grubosc (mm)", "Cena PLN/kg"]
-        self._write_headers(ws3, headers)
-
-        film_query = self.db.query(FilmPrice)
-        if only_active:
-            film_query = film_query.filter(FilmPrice.is_active == True)
-
-        if thickness_min is not None:
-            film_query = film_query.filter(FilmPrice.thickness >= thickness_min)
-        if thickness_max is not None:
-            film_query = film_query.filter(FilmPrice.thickness <= thickness_max)
-
-        film_prices = film_query.order_by(FilmPrice.film_type, FilmPrice.thickness).all()
-
-        for row_idx, price in enumerate(film_prices, start=2):
-            ws3.cell(row=row_idx, column=1, value=price.film_type.value)
-            ws3.cell(row=row_idx, column=2, value=price.thickness)
-            ws3.cell(row=row_idx, column=3, value=price.price_pln_per_kg)
-
-            for col in range(1, 4):
-                ws3.cell(row=row_idx, column=col).border = self.BORDER
+        self._write_sheet(
+            wb, "Cennik folii", self.FILM_HEADERS,
+            self._iter_film_rows(
+                thickness_min=thickness_min,
+                thickness_max=thickness_max,
+                only_active=only_active,
+            ),
+            center_cols=self.FILM_CENTER_COLS,
+        )
 
-        self._autofit_columns(ws3)
+        # === Arkusze 4-5: Modyfikatory grubosci i szerokosci ===
+        self._write_modifier_sheets(wb)
 
-        # === Arkusz 4: Modyfikatory grubosci ===
-        ws4 = wb.create_sheet("Modyfikatory grubosci")
-
-        headers = ["Gatunek", "Wykoncznie", "Szerokosc bazowa", "Grubosc (mm)", "Modyfikator PLN/kg"]
-        self._write_headers(ws4, headers)
-
-        thickness_mods = self.db.query(ThicknessModifier).order_by(
-            ThicknessModifier.grade, ThicknessModifier.thickness
-        ).all()
-
-        for row_idx, mod in enumerate(thickness_mods, start=2):
-            ws4.cell(row=row_idx, column=1, value=mod.grade)
-            ws4.cell(row=row_idx, column=2, value=mod.surface_finish)
-            ws4.cell(row=row_idx, column=3, value=mod.base_width)
-            ws4.cell(row=row_idx, column=4, value=mod.thickness)
-            ws4.cell(row=row_idx, column=5, value=mod.price_modifier)
-
-            for col in range(1, 6):
-                ws4.cell(row=row_idx, column=col).border = self.BORDER
-
-        self._autofit_columns(ws4)
-
-        # === Arkusz 5: Modyfikatory szerokosci ===
-        ws5 = wb.create_sheet("Modyfikatory szerokosci")
-
-        headers = ["Gatunek", "Szerokosc (mm)", "Modyfikator PLN/kg"]
-        self._write_headers(ws5, headers)
-
-        width_mods = self.db.query(WidthModifier).order_by(WidthModifier.width).all()
-
-        for row_idx, mod in enumerate(width_mods, start=2):
-            ws5.cell(row=row_idx, column=1, value=mod.grade or "(wszystkie)")
-            ws5.cell(row=row_idx, column=2, value=mod.width)
-            ws5.cell(row=row_idx, column=3, value=mod.price_modifier)
-
-            for col in range(1, 4):
-                ws5.cell(row=row_idx, column=col).border = self.BORDER
-
-        self._autofit_columns(ws5)
-
-        # Zapisz
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output.read()
+        return self._save(wb)
 
     def export_base_prices_csv(
         self,
@@ -521,79 +283,327 @@ class PriceExporter:
         Returns:
             str: Zawartosc pliku CSV
         """
-        import csv
-        from io import StringIO
+        return "".join(self.iter_base_prices_csv(
+            categories=categories,
+            thickness_min=thickness_min,
+            thickness_max=thickness_max,
+            surface_finishes=surface_finishes,
+            only_active=only_active,
+        ))
+
+    def iter_base_prices_csv(
+        self,
+        categories: Optional[list[str]] = None,
+        thickness_min: Optional[float] = None,
+        thickness_max: Optional[float] = None,
+        surface_finishes: Optional[list[str]] = None,
+        only_active: bool = True,
+    ) -> Iterator[str]:
+        """Eksportuj ceny bazowe do CSV fragmentami - do StreamingResponse.
 
+        Zwraca naglowek, a potem paczki po EXPORT_YIELD_PER wierszy, gdy tylko
+        zostana pobrane z bazy; caly plik nie jest skladany w pamieci.
+
+        Returns:
+            Iterator[str]: Kolejne fragmenty pliku CSV
+        """
         output = StringIO()
         writer = csv.writer(output, delimiter=";")
 
+        def flush() -> str:
+            chunk = output.getvalue()
+            output.seek(0)
+            output.truncate()
+            return chunk
+
         # Naglowki
-        writer.writerow([
-            "Gatunek", "Nazwa materialu", "Kategoria", "Wykoncznie",
-            "Grubosc (mm)", "Szerokosc (mm)", "Dlugosc (mm)", "Cena PLN/kg", "Uwagi"
-        ])
+        writer.writerow([header for header, _ in self.BASE_PRICE_HEADERS])
+        yield flush()
+
+        rows = self._iter_base_price_rows(
+            categories=categories,
+            thickness_min=thickness_min,
+            thickness_max=thickness_max,
+            surface_finishes=surface_finishes,
+            only_active=only_active,
+        )
+        for row_count, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if row_count % EXPORT_YIELD_PER == 0:
+                yield flush()
+
+        rest = flush()
+        if rest:
+            yield rest
+
+    def _iter_base_price_rows(
+        self,
+        categories: Optional[list[str]] = None,
+        thickness_min: Optional[float] = None,
+        thickness_max: Optional[float] = None,
+        width_min: Optional[float] = None,
+        width_max: Optional[float] = None,
+        surface_finishes: Optional[list[str]] = None,
+        only_active: bool = True,
+    ) -> Iterator[tuple]:
+        """Wiersze cen bazowych (kolumny BASE_PRICE_HEADERS) wprost z zapytania.
 
-        # Pobierz dane
-        query = self.db.query(BasePrice).options(joinedload(BasePrice.material))
+        Pobierane sa tylko eksportowane kolumny - bez obiektow ORM.
+        """
+        query = self.db.query(
+            Material.grade,
+            Material.name,
+            Material.category,
+            BasePrice.surface_finish,
+            BasePrice.thickness,
+            BasePrice.width,
+            BasePrice.length,
+            BasePrice.price_pln_per_kg,
+            BasePrice.notes,
+        ).join(BasePrice.material)
 
         if only_active:
             query = query.filter(BasePrice.is_active == True)
 
         if categories:
             category_enums = [MaterialCategory(c) for c in categories]
-            query = query.join(Material).filter(Material.category.in_(category_enums))
+            query = query.filter(Material.category.in_(category_enums))
 
         if thickness_min is not None:
             query = query.filter(BasePrice.thickness >= thickness_min)
         if thickness_max is not None:
             query = query.filter(BasePrice.thickness <= thickness_max)
 
+        if width_min is not None:
+            query = query.filter(BasePrice.width >= width_min)
+        if width_max is not None:
+            query = query.filter(BasePrice.width <= width_max)
+
         if surface_finishes:
             query = query.filter(BasePrice.surface_finish.in_(surface_finishes))
 
         prices = query.order_by(
-            BasePrice.material_id, BasePrice.surface_finish,
-            BasePrice.thickness, BasePrice.width
-        ).all()
-
-        for price in prices:
-            material = price.material
-            writer.writerow([
-                material.grade,
-                material.name,
-                material.category.value,
-                price.surface_finish,
-                price.thickness,
-                price.width,
-                price.length,
-                price.price_pln_per_kg,
-                price.notes or "",
-            ])
-
-        return output.getvalue()
-
-    def _write_headers(self, ws, headers: list[str]):
-        """Zapisz sformatowane naglowki do arkusza."""
-        for col_idx, header in enumerate(headers, start=1):
-            cell = ws.cell(row=1, column=col_idx, value=header)
+            BasePrice.material_id,
+            BasePrice.surface_finish,
+            BasePrice.thickness,
+            BasePrice.width
+        ).yield_per(EXPORT_YIELD_PER)
+
+        for grade, name, category, surface_finish, thickness, width, length, price, notes in prices:
+            yield (
+                grade,
+                name,
+                _CATEGORY_STR[category],
+                surface_finish,
+                thickness,
+                width,
+                length,
+                price,
+                notes or "",
+            )
+
+    def _iter_grinding_rows(
+        self,
+        providers: Optional[list[str]] = None,
+        thickness_min: Optional[float] = None,
+        thickness_max: Optional[float] = None,
+        only_active: bool = True,
+    ) -> Iterator[tuple]:
+        """Wiersze cennika szlifu (kolumny GRINDING_HEADERS) wprost z zapytania."""
+        query = self.db.query(
+            GrindingPrice.provider,
+            GrindingPrice.grit,
+            GrindingPrice.thickness,
+            GrindingPrice.price_pln_per_kg,
+            GrindingPrice.with_sb,
+            GrindingPrice.width_variant,
+        )
+
+        if only_active:
+            query = query.filter(GrindingPrice.is_active == True)
+
+        if providers:
+            provider_enums = [GrindingProvider(p) for p in providers]
+            query = query.filter(GrindingPrice.provider.in_(provider_enums))
+
+        if thickness_min is not None:
+            query = query.filter(GrindingPrice.thickness >= thickness_min)
+        if thickness_max is not None:
+            query = query.filter(GrindingPrice.thickness <= thickness_max)
+
+        prices = query.order_by(
+            GrindingPrice.provider,
+            GrindingPrice.grit,
+            GrindingPrice.thickness
+        ).yield_per(EXPORT_YIELD_PER)
+
+        for provider, grit, thickness, price, with_sb, width_variant in prices:
+            yield (
+                _PROVIDER_STR[provider],
+                grit,
+                thickness,
+                price,
+                _SB_LABEL[with_sb],
+                width_variant or "",
+            )
+
+    def _iter_film_rows(
+        self,
+        film_types: Optional[list[str]] = None,
+        thickness_min: Optional[float] = None,
+        thickness_max: Optional[float] = None,
+        only_active: bool = True,
+    ) -> Iterator[tuple]:
+        """Wiersze cennika folii (kolumny FILM_HEADERS) wprost z zapytania."""
+        query = self.db.query(
+            FilmPrice.film_type,
+            FilmPrice.thickness,
+            FilmPrice.price_pln_per_kg,
+        )
+
+        if only_active:
+            query = query.filter(FilmPrice.is_active == True)
+
+        if film_types:
+            type_enums = [FilmType(t) for t in film_types]
+            query = query.filter(FilmPrice.film_type.in_(type_enums))
+
+        if thickness_min is not None:
+            query = query.filter(FilmPrice.thickness >= thickness_min)
+        if thickness_max is not None:
+            query = query.filter(FilmPrice.thickness <= thickness_max)
+
+        prices = query.order_by(
+            FilmPrice.film_type,
+            FilmPrice.thickness
+        ).yield_per(EXPORT_YIELD_PER)
+
+        for film_type, thickness, price in prices:
+            yield _FILM_STR[film_type], thickness, price
+
+    def _iter_modifier_rows(self):
+        """Wiersze obu tabel modyfikatorow z jednego zapytania UNION ALL.
+
+        Kolumna "kind" ("thickness" / "width") rozroznia zrodlo wiersza;
+        kolumny nieobecne w danej tabeli sa NULL-ami. Wiersze posortowane
+        najpierw po "kind", wiec kazda tabela tworzy ciagly blok.
+        """
+        thickness_mods = select(
+            literal("thickness", String).label("kind"),
+            ThicknessModifier.grade.label("grade"),
+            ThicknessModifier.surface_finish.label("surface_finish"),
+            ThicknessModifier.base_width.label("base_width"),
+            ThicknessModifier.thickness.label("thickness"),
+            null().cast(Float).label("width"),
+            ThicknessModifier.price_modifier.label("price_modifier"),
+        )
+        width_mods = select(
+            literal("width", String),
+            WidthModifier.grade,
+            null().cast(String),
+            null().cast(Float),
+            null().cast(Float),
+            WidthModifier.width,
+            WidthModifier.price_modifier,
+        )
+        # Dla grubosci kolejnosc (gatunek, wykonczenie, grubosc), dla
+        # szerokosci (gatunek, szerokosc) - kolumny drugiej tabeli sa NULL
+        query = union_all(thickness_mods, width_mods).order_by(
+            "kind", "grade", "surface_finish", "thickness", "width"
+        )
+        return self.db.execute(query, execution_options={"yield_per": EXPORT_YIELD_PER})
+
+    def _write_modifier_sheets(self, wb: Workbook):
+        """Dopisz arkusze modyfikatorow grubosci i szerokosci.
+
+        Oba arkusze sa zakladane z naglowkami od razu (takze gdy tabela jest
+        pusta), a wiersze z jednego kursora trafiaja do arkusza wg "kind".
+        """
+        thickness_ws = wb.create_sheet("Modyfikatory grubosci")
+        self._write_headers(thickness_ws, self.THICKNESS_MODIFIER_HEADERS)
+        width_ws = wb.create_sheet("Modyfikatory szerokosci")
+        self._write_headers(width_ws, self.WIDTH_MODIFIER_HEADERS)
+
+        append_row = self._append_row
+        for kind, rows in groupby(self._iter_modifier_rows(), key=attrgetter("kind")):
+            if kind == "thickness":
+                for row in rows:
+                    append_row(thickness_ws, (
+                        row.grade, row.surface_finish, row.base_width,
+                        row.thickness, row.price_modifier,
+                    ))
+            else:
+                for row in rows:
+                    append_row(width_ws, (
+                        row.grade or "(wszystkie)", row.width, row.price_modifier,
+                    ))
+
+    def _write_sheet(
+        self,
+        wb: Workbook,
+        title: str,
+        headers: list[tuple[str, int]],
+        rows: Iterable[tuple],
+        center_cols: tuple[int, ...] = (),
+    ):
+        """Utworz arkusz z naglowkami i zapisz do niego wiersze z generatora."""
+        ws = wb.create_sheet(title)
+        self._write_headers(ws, headers)
+        append_row = self._append_row
+        for row in rows:
+            append_row(ws, row, center_cols)
+
+    def _new_workbook(self) -> Workbook:
+        """Nowy skoroszyt w trybie write_only ze stylami komorek danych.
+
+        Wiersze zapisywane sa strumieniowo, bez siatki komorek w pamieci.
+        Obramowanie i wysrodkowanie danych sa stylami nazwanymi - zapisane
+        raz w tabeli stylow skoroszytu zamiast osobno dla kazdej komorki.
+        """
+        wb = Workbook(write_only=True)
+        wb.add_named_style(NamedStyle(name="data", border=self.BORDER))
+        wb.add_named_style(
+            NamedStyle(name="data_num", border=self.BORDER, alignment=self.CENTER_ALIGN)
+        )
+        return wb
+
+    def _write_headers(self, ws, headers: list[tuple[str, int]]):
+        """Ustaw szerokosci kolumn i zapisz sformatowane naglowki do arkusza.
+
+        Musi byc wywolane przed zapisaniem pierwszego wiersza danych.
+        """
+        cells = []
+        for col_idx, (header, width) in enumerate(headers, start=1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+            cell = WriteOnlyCell(ws, value=header)
             cell.fill = self.HEADER_FILL
             cell.font = self.HEADER_FONT
             cell.border = self.BORDER
             cell.alignment = self.CENTER_ALIGN
-
-    def _autofit_columns(self, ws):
-        """Automatyczne dopasowanie szerokosci kolumn."""
-        for column_cells in ws.columns:
-            max_length = 0
-            column = column_cells[0].column_letter
-            for cell in column_cells:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except Exception:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
+            cells.append(cell)
+        ws.append(cells)
+
+    def _append_row(self, ws, values: tuple, center_cols: tuple[int, ...] = ()):
+        """Dopisz wiersz danych z obramowaniem; kolumny center_cols wysrodkowane."""
+        cells = []
+        append = cells.append
+        for col_idx, value in enumerate(values, start=1):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = "data_num" if col_idx in center_cols else "data"
+            append(cell)
+        ws.append(cells)
+
+    def _save(self, wb: Workbook) -> IO[bytes]:
+        """Zapisz skoroszyt do pliku tymczasowego i zwroc go ustawionego na poczatek.
+
+        Maly plik zostaje w pamieci, duzy jest zrzucany na dysk - bez kopii
+        calej zawartosci jako bytes.
+        """
+        output = SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE, mode="w+b")
+        wb.save(output)
+        output.seek(0)
+        return output
 
     def get_export_filename(self, data_type: str, format: str = "xlsx") -> str:
         """Wygeneruj nazwe pliku eksportu.
@@ -605,13 +615,4 @@ class PriceExporter:
         Returns:
             str: Nazwa pliku z datą
         """
-        type_names = {
-            "base_prices": "ceny_bazowe",
-            "grinding": "cennik_szlifu",
-            "film": "cennik_folii",
-            "modifiers": "modyfikatory",
-            "all": "cennik_pelny",
-        }
-        name = type_names.get(data_type, data_type)
-        date_str = datetime.now().strftime("%Y%m%d_%H%M")
-        return f"{name}_{date_str}.{format}"
+        return f"{_TYPE_NAMES.get(data_type, data_type)}_{datetime.now():%Y%m%d_%H%M}.{format}"
@@ -1,10 +1,31 @@
 """Serwis walidacji szlifowania - sprawdza dostępność na podstawie matryc cen."""
 
+import copy
+import time
+from collections import defaultdict
+from itertools import groupby
 from typing import Optional
 
+from sqlalchemy import case, insert, or_, update
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
 from ..models import GrindingPrice, GrindingProvider
+from .pricing import invalidate_price_lookups
+
+
+# Matryce cen współdzielone przez instancje serwisu (tworzone na każde żądanie),
+# osobno dla każdej bazy: engine -> ({(dostawca, wariant): matryca}, czas wygaśnięcia).
+# Czyszczone przy zapisie cen szlifu (invalidate_grinding_matrices)
+MATRIX_CACHE_TTL = 60.0
+_matrices_by_engine: dict[Engine, tuple[dict[tuple, dict], float]] = {}
+
+
+def invalidate_grinding_matrices(provider: Optional[GrindingProvider] = None) -> None:
+    """Usuń zapamiętane matryce dostawcy (bez dostawcy - wszystkie) po zapisie cen."""
+    for matrices, _ in _matrices_by_engine.values():
+        for key in [key for key in matrices if provider is None or key[0] == provider]:
+            del matrices[key]
 
 
 class GrindingValidationService:
@@ -17,6 +38,15 @@ class GrindingValidationService:
     def __init__(self, db: Session):
         self.db = db
 
+    def _matrices(self) -> dict[tuple, dict]:
+        """Zapamiętane matryce dla bazy sesji (czyszczone co MATRIX_CACHE_TTL)."""
+        bind = self.db.get_bind()
+        now = time.monotonic()
+        cached = _matrices_by_engine.get(bind)
+        if not cached or now >= cached[1]:
+            cached = _matrices_by_engine[bind] = ({}, now + MATRIX_CACHE_TTL)
+        return cached[0]
+
     def get_available_providers(
         self,
         thickness: float,
@@ -35,46 +65,48 @@ class GrindingValidationService:
         Returns:
             Lista słowników z dostępnymi dostawcami i ich opcjami
         """
-        results = []
+        # Wszyscy dostawcy jednym zapytaniem
+        borys_width_variant = "x1000/1250/1500" if width <= 1500 else "x2000"
+        query = self.db.query(GrindingPrice).filter(
+            GrindingPrice.thickness == thickness,
+            GrindingPrice.price_pln_per_kg > 0,  # Tylko dostępne (cena > 0)
+            GrindingPrice.is_active == True,
+            # Dla BORYS sprawdź wariant szerokości
+            or_(
+                GrindingPrice.provider != GrindingProvider.BORYS,
+                GrindingPrice.width_variant == borys_width_variant,
+            ),
+        )
 
-        for provider in GrindingProvider:
-            query = self.db.query(GrindingPrice).filter(
-                GrindingPrice.provider == provider,
-                GrindingPrice.thickness == thickness,
-                GrindingPrice.price_pln_per_kg > 0,  # Tylko dostępne (cena > 0)
-                GrindingPrice.is_active == True,
-            )
+        if grit:
+            query = query.filter(GrindingPrice.grit == grit)
 
-            if grit:
-                query = query.filter(GrindingPrice.grit == grit)
+        # Dostawcy w kolejności GrindingProvider, w obrębie dostawcy po
+        # granulacji i SB - grupowanie jednym przejściem po wynikach
+        provider_order = case(
+            {provider: position for position, provider in enumerate(GrindingProvider)},
+            value=GrindingPrice.provider,
+        )
+        prices = query.order_by(
+            provider_order,
+            GrindingPrice.grit,
+            GrindingPrice.with_sb,
+            GrindingPrice.id,
+        ).all()
 
-            # Dla BORYS sprawdź wariant szerokości
-            if provider == GrindingProvider.BORYS:
-                if width <= 1500:
-                    query = query.filter(
-                        GrindingPrice.width_variant == "x1000/1250/1500"
-                    )
-                else:
-                    query = query.filter(GrindingPrice.width_variant == "x2000")
-
-            prices = query.all()
-
-            if prices:
-                # Grupuj po granulacji i wariancie SB
-                grits_set = set()
-                prices_dict = {}
-
-                for p in prices:
-                    key = f"{p.grit}{'_sb' if p.with_sb else ''}"
-                    grits_set.add(p.grit)
-                    prices_dict[key] = p.price_pln_per_kg
-
-                results.append({
-                    "provider": provider.value,
-                    "grits": list(grits_set),
-                    "prices": prices_dict,
-                    "width_variant": prices[0].width_variant if prices else None,
-                })
+        results = []
+
+        for provider, provider_prices in groupby(prices, key=lambda p: p.provider):
+            provider_prices = list(provider_prices)
+            results.append({
+                "provider": provider.value,
+                "grits": list(dict.fromkeys(p.grit for p in provider_prices)),
+                "prices": {
+                    f"{p.grit}{'_sb' if p.with_sb else ''}": p.price_pln_per_kg
+                    for p in provider_prices
+                },
+                "width_variant": provider_prices[0].width_variant,
+            })
 
         return results
 
@@ -137,6 +169,13 @@ class GrindingValidationService:
         Returns:
             Słownik z matrycą cen
         """
+        # Kopia zapamiętanej matrycy - zmiany wyniku u wywołującego nie psują cache
+        matrices = self._matrices()
+        cache_key = (provider, width_variant)
+        cached = matrices.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
         query = self.db.query(GrindingPrice).filter(
             GrindingPrice.provider == provider,
             GrindingPrice.is_active == True,
@@ -145,20 +184,21 @@ class GrindingValidationService:
         if width_variant:
             query = query.filter(GrindingPrice.width_variant == width_variant)
 
-        prices = query.order_by(GrindingPrice.thickness).all()
+        prices = query.order_by(
+            GrindingPrice.thickness,
+            GrindingPrice.grit,
+            GrindingPrice.with_sb,
+            GrindingPrice.id,
+        ).all()
 
-        # Grupuj po grubości
-        matrix = {}
-        thicknesses = set()
-        grits = set()
+        # Grupuj po grubości - wiersze przychodzą posortowane po grubości,
+        # więc kolejność kluczy matrycy jest już rosnąca
+        matrix = defaultdict(dict)
+        grits = {}
 
         for p in prices:
-            thicknesses.add(p.thickness)
-            if p.thickness not in matrix:
-                matrix[p.thickness] = {}
-
             key = f"{p.grit}{'_sb' if p.with_sb else ''}"
-            grits.add(key)
+            grits[key] = None
 
             matrix[p.thickness][key] = {
                 "id": p.id,
@@ -168,13 +208,15 @@ class GrindingValidationService:
                 "with_sb": p.with_sb,
             }
 
-        return {
+        result = {
             "provider": provider.value,
             "width_variant": width_variant,
-            "matrix": matrix,
-            "thicknesses": sorted(thicknesses),
+            "matrix": dict(matrix),
+            "thicknesses": list(matrix),
             "grits": sorted(grits),
         }
+        matrices[cache_key] = result
+        return copy.deepcopy(result)
 
     def update_grinding_price(
         self,
@@ -211,6 +253,8 @@ class GrindingValidationService:
         if existing:
             existing.price_pln_per_kg = price
             self.db.commit()
+            invalidate_grinding_matrices(provider)
+            invalidate_price_lookups()
             return existing
         else:
             new_price = GrindingPrice(
@@ -223,6 +267,8 @@ class GrindingValidationService:
             )
             self.db.add(new_price)
             self.db.commit()
+            invalidate_grinding_matrices(provider)
+            invalidate_price_lookups()
             return new_price
 
     def bulk_update_matrix(
@@ -240,16 +286,58 @@ class GrindingValidationService:
         Returns:
             Liczba zaktualizowanych wpisów
         """
-        count = 0
-        for update in updates:
-            self.update_grinding_price(
-                provider=provider,
-                thickness=update["thickness"],
-                grit=update["grit"],
-                price=update["price"],
-                width_variant=update.get("width_variant"),
-                with_sb=update.get("with_sb", False),
+        # Istniejące ceny dostawcy wczytane jednym zapytaniem:
+        # (granulacja, grubość, wariant szerokości, SB) -> id
+        existing_index: dict[tuple, int] = {}
+        for price_id, *key in self.db.query(
+            GrindingPrice.id,
+            GrindingPrice.grit,
+            GrindingPrice.thickness,
+            GrindingPrice.width_variant,
+            GrindingPrice.with_sb,
+        ).filter(
+            GrindingPrice.provider == provider,
+        ).order_by(GrindingPrice.id):
+            existing_index.setdefault(tuple(key), price_id)
+
+        # Zmiany cen do wsadowego UPDATE, nowe kombinacje do wsadowego INSERT;
+        # klucz pozwala wykryć powtórzenia w obrębie jednego żądania
+        to_update: dict[int, float] = {}
+        to_insert: dict[tuple, dict] = {}
+
+        for item in updates:
+            key = (
+                item["grit"],
+                item["thickness"],
+                item.get("width_variant"),
+                item.get("with_sb", False),
             )
-            count += 1
+            existing_id = existing_index.get(key)
 
-        return count
+            if existing_id is not None:
+                to_update[existing_id] = item["price"]
+            elif key in to_insert:
+                to_insert[key]["price_pln_per_kg"] = item["price"]
+            else:
+                to_insert[key] = {
+                    "provider": provider,
+                    "thickness": item["thickness"],
+                    "grit": item["grit"],
+                    "price_pln_per_kg": item["price"],
+                    "width_variant": item.get("width_variant"),
+                    "with_sb": item.get("with_sb", False),
+                }
+
+        if to_update:
+            self.db.execute(
+                update(GrindingPrice),
+                [{"id": price_id, "price_pln_per_kg": price} for price_id, price in to_update.items()],
+            )
+        if to_insert:
+            self.db.execute(insert(GrindingPrice), list(to_insert.values()))
+
+        # Jeden commit dla całej matrycy
+        self.db.commit()
+        invalidate_grinding_matrices(provider)
+        invalidate_price_lookups()
+        return len(updates)
@@ -1,16 +1,17 @@
 """Serwis do kalkulacji cen z uwzględnieniem wszystkich modyfikatorów."""
 
+import math
+import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Iterator, Optional
 
-from sqlalchemy.orm import Session
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, joinedload
 
 from ..models import (
     Material,
     MaterialCategory,
     BasePrice,
-    ThicknessModifier,
-    WidthModifier,
     ExchangeRate,
     GrindingPrice,
     GrindingProvider,
@@ -19,8 +20,41 @@ from ..models import (
     ProcessingOption,
 )
 
+# Kurs EUR/PLN współdzielony przez instancje serwisu (zwykle jedna na żądanie
+# HTTP), osobno dla każdej bazy: engine -> (kurs, czas wygaśnięcia)
+EXCHANGE_RATE_TTL = 60.0
+_rates_by_engine: dict[Engine, tuple[float, float]] = {}
+
+# Ograniczenia obróbki wczytywane całą (małą) tabelą, osobno dla każdej bazy:
+# engine -> ({(gatunek, powierzchnia): ograniczenia}, czas wygaśnięcia).
+# Ograniczenia: (tmin, tmax, wmin, wmax, szlif_dozwolony, uwagi), brak limitu = ±inf
+PROCESSING_OPTIONS_TTL = 60.0
+_processing_bounds_by_engine: dict[Engine, tuple[dict[tuple, tuple], float]] = {}
+
+# Wyniki wyszukiwania cen folii i szlifu (małe, rzadko zmieniane tabele),
+# osobno dla każdej bazy: engine -> ({argumenty: cena}, czas wygaśnięcia).
+# Czyszczone przy zapisie cen (invalidate_price_lookups), najwyżej
+# PRICE_LOOKUP_MAXSIZE wpisów na bazę - najstarszy jest usuwany
+PRICE_LOOKUP_TTL = 60.0
+PRICE_LOOKUP_MAXSIZE = 1024
+_price_lookups_by_engine: dict[Engine, tuple[dict[tuple, Optional[float]], float]] = {}
+
+# Klucze wierszy tabeli cennikowej (kolejność jak wartości w get_price_table)
+_PRICE_TABLE_KEYS = (
+    "id", "material_id", "material_name", "grade", "category", "surface_finish",
+    "thickness", "width", "length", "price_pln_per_kg", "price_eur_per_kg", "notes",
+)
+
+# Liczba wierszy tabeli cennikowej pobieranych z bazy na raz
+PRICE_TABLE_YIELD_PER = 500
+
+
+def invalidate_price_lookups() -> None:
+    """Wyczyść zapamiętane ceny folii i szlifu - wywoływane po zapisie tych cen."""
+    _price_lookups_by_engine.clear()
+
 
-@dataclass
+@dataclass(slots=True)
 class PriceBreakdown:
     """Szczegółowy rozbicie ceny."""
 
@@ -96,21 +130,33 @@ class PricingService:
     # Gęstość stali nierdzewnej w g/cm³
     STEEL_DENSITY = 7.9
 
+    # Przeliczniki jednostek: g/cm³ × mm³ -> kg oraz mm² -> m² (dzielniki
+    # całkowite - jedno dokładne dzielenie zamiast kilku zaokrąglających)
+    _MM3_PER_KG_DIVISOR = 1_000_000
+    _MM2_PER_M2_DIVISOR = 1_000_000
+
     def __init__(self, db: Session):
         self.db = db
         self._exchange_rate: Optional[float] = None
 
     @property
     def exchange_rate(self) -> float:
-        """Pobierz aktualny kurs EUR/PLN."""
+        """Pobierz aktualny kurs EUR/PLN (z bazy najwyżej raz na EXCHANGE_RATE_TTL)."""
         if self._exchange_rate is None:
-            rate = (
-                self.db.query(ExchangeRate)
-                .filter(ExchangeRate.is_active == True)
-                .order_by(ExchangeRate.valid_from.desc())
-                .first()
-            )
-            self._exchange_rate = rate.rate if rate else 4.38
+            bind = self.db.get_bind()
+            now = time.monotonic()
+            cached = _rates_by_engine.get(bind)
+            if cached and now < cached[1]:
+                self._exchange_rate = cached[0]
+            else:
+                rate = (
+                    self.db.query(ExchangeRate)
+                    .filter(ExchangeRate.is_active == True)
+                    .order_by(ExchangeRate.valid_from.desc())
+                    .first()
+                )
+                self._exchange_rate = rate.rate if rate else 4.38
+                _rates_by_engine[bind] = (self._exchange_rate, now + EXCHANGE_RATE_TTL)
         return self._exchange_rate
 
     def calculate_weight(
@@ -130,14 +176,13 @@ class PricingService:
         if density is None:
             density = self.STEEL_DENSITY
 
-        # Objętość w cm³
-        volume_cm3 = (thickness / 10) * (width / 10) * (length / 10)
-        # Waga w kg
-        return (density * volume_cm3) / 1000
+        # Objętość w mm³ (dokładna dla wymiarów całkowitych), potem jedno przeliczenie na kg
+        volume_mm3 = thickness * width * length
+        return density * volume_mm3 / self._MM3_PER_KG_DIVISOR
 
     def calculate_area(self, width: float, length: float) -> float:
         """Oblicz powierzchnię arkusza w m²."""
-        return (width / 1000) * (length / 1000)
+        return width * length / self._MM2_PER_M2_DIVISOR
 
     def get_base_price(
         self,
@@ -156,24 +201,56 @@ class PricingService:
                 BasePrice.width == width,
                 BasePrice.is_active == True,
             )
+            .options(joinedload(BasePrice.material))
             .order_by(BasePrice.valid_from.desc())
             .first()
         )
 
+    def preload_price_matrix(
+        self, material_ids: list[int], surface_finishes: list[str]
+    ) -> dict[tuple, BasePrice]:
+        """Wczytaj aktywne ceny bazowe materiałów jednym zapytaniem.
+
+        Wynik można przekazać do calculate_price (base_price_cache) przy
+        wycenie wielu wymiarów tych samych materiałów.
+
+        Returns:
+            Słownik (material_id, surface_finish, thickness, width) -> najnowsza BasePrice
+        """
+        prices = (
+            self.db.query(BasePrice)
+            .options(joinedload(BasePrice.material))
+            .filter(
+                BasePrice.material_id.in_(material_ids),
+                BasePrice.surface_finish.in_(surface_finishes),
+                BasePrice.is_active == True,
+            )
+            .order_by(BasePrice.valid_from)
+        )
+        # Rosnąco po valid_from - najnowsza cena nadpisuje starsze
+        return {
+            (p.material_id, p.surface_finish, p.thickness, p.width): p
+            for p in prices
+        }
+
     def get_film_price(
         self, film_type: FilmType, thickness: float
     ) -> Optional[float]:
         """Pobierz cenę folii dla danej grubości."""
-        film = (
-            self.db.query(FilmPrice)
-            .filter(
-                FilmPrice.film_type == film_type,
-                FilmPrice.thickness == thickness,
-                FilmPrice.is_active == True,
+        key = ("film", film_type, thickness)
+        lookups = self._price_lookups()
+        if key not in lookups:
+            film = (
+                self.db.query(FilmPrice)
+                .filter(
+                    FilmPrice.film_type == film_type,
+                    FilmPrice.thickness == thickness,
+                    FilmPrice.is_active == True,
+                )
+                .first()
             )
-            .first()
-        )
-        return film.price_pln_per_kg if film else None
+            self._remember_price(lookups, key, film.price_pln_per_kg if film else None)
+        return lookups[key]
 
     def get_grinding_price(
         self,
@@ -184,6 +261,11 @@ class PricingService:
         with_sb: bool = False,
     ) -> Optional[float]:
         """Pobierz cenę szlifowania."""
+        key = ("grinding", provider, thickness, grit, width_variant, with_sb)
+        lookups = self._price_lookups()
+        if key in lookups:
+            return lookups[key]
+
         query = self.db.query(GrindingPrice).filter(
             GrindingPrice.provider == provider,
             GrindingPrice.thickness == thickness,
@@ -198,7 +280,26 @@ class PricingService:
             query = query.filter(GrindingPrice.with_sb == True)
 
         result = query.first()
-        return result.price_pln_per_kg if result else None
+        self._remember_price(lookups, key, result.price_pln_per_kg if result else None)
+        return lookups[key]
+
+    def _price_lookups(self) -> dict[tuple, Optional[float]]:
+        """Zapamiętane ceny folii i szlifu dla bazy sesji (czyszczone co PRICE_LOOKUP_TTL)."""
+        bind = self.db.get_bind()
+        now = time.monotonic()
+        cached = _price_lookups_by_engine.get(bind)
+        if not cached or now >= cached[1]:
+            cached = _price_lookups_by_engine[bind] = ({}, now + PRICE_LOOKUP_TTL)
+        return cached[0]
+
+    @staticmethod
+    def _remember_price(
+        lookups: dict[tuple, Optional[float]], key: tuple, price: Optional[float]
+    ):
+        """Zapamiętaj cenę, usuwając najstarszy wpis po przekroczeniu PRICE_LOOKUP_MAXSIZE."""
+        if len(lookups) >= PRICE_LOOKUP_MAXSIZE:
+            del lookups[next(iter(lookups))]
+        lookups[key] = price
 
     def check_processing_allowed(
         self,
@@ -213,35 +314,60 @@ class PricingService:
         Returns:
             (czy_dozwolone, uwagi)
         """
-        option = (
-            self.db.query(ProcessingOption)
-            .filter(
-                ProcessingOption.grade == grade,
-                ProcessingOption.surface_finish == surface_finish,
-            )
-            .first()
-        )
-
-        if not option:
+        bounds = self._get_processing_bounds(grade, surface_finish)
+        return self._check_bounds(bounds, thickness, width, grinding_provider)
+
+    def _get_processing_bounds(
+        self, grade: str, surface_finish: str
+    ) -> Optional[tuple]:
+        """Ograniczenia obróbki dla gatunku i powierzchni (z pamięci podręcznej)."""
+        bind = self.db.get_bind()
+        now = time.monotonic()
+        cached = _processing_bounds_by_engine.get(bind)
+        if cached and now < cached[1]:
+            return cached[0].get((grade, surface_finish))
+
+        inf = math.inf
+        bounds_by_key = {}
+        for option in self.db.query(ProcessingOption).order_by(ProcessingOption.id):
+            # Limit 0 / NULL oznacza brak ograniczenia
+            bounds_by_key.setdefault((option.grade, option.surface_finish), (
+                option.thickness_min or -inf,
+                option.thickness_max or inf,
+                option.width_min or -inf,
+                option.width_max or inf,
+                option.grinding_allowed,
+                option.notes,
+            ))
+        _processing_bounds_by_engine[bind] = (bounds_by_key, now + PROCESSING_OPTIONS_TTL)
+        return bounds_by_key.get((grade, surface_finish))
+
+    @staticmethod
+    def _check_bounds(
+        bounds: Optional[tuple],
+        thickness: float,
+        width: float,
+        grinding_provider: Optional[str] = None,
+    ) -> tuple[bool, Optional[str]]:
+        """Sprawdź wymiary i szlif względem ograniczeń obróbki."""
+        if bounds is None:
             return True, None  # Brak ograniczeń
 
-        # Sprawdź zakres grubości
-        if option.thickness_min and thickness < option.thickness_min:
-            return False, f"Grubość poniżej minimum ({option.thickness_min}mm)"
-        if option.thickness_max and thickness > option.thickness_max:
-            return False, f"Grubość powyżej maksimum ({option.thickness_max}mm)"
-
-        # Sprawdź zakres szerokości
-        if option.width_min and width < option.width_min:
-            return False, f"Szerokość poniżej minimum ({option.width_min}mm)"
-        if option.width_max and width > option.width_max:
-            return False, f"Szerokość powyżej maksimum ({option.width_max}mm)"
-
-        # Sprawdź szlifowanie
-        if grinding_provider and not option.grinding_allowed:
-            return False, option.notes or "Szlifowanie niedostępne"
-
-        return True, option.notes
+        tmin, tmax, wmin, wmax, grinding_allowed, notes = bounds
+        if tmin <= thickness <= tmax and wmin <= width <= wmax:
+            # Sprawdź szlifowanie
+            if grinding_provider and not grinding_allowed:
+                return False, notes or "Szlifowanie niedostępne"
+            return True, notes
+
+        # Komunikat dla pierwszego przekroczonego limitu
+        if thickness < tmin:
+            return False, f"Grubość poniżej minimum ({tmin}mm)"
+        if thickness > tmax:
+            return False, f"Grubość powyżej maksimum ({tmax}mm)"
+        if width < wmin:
+            return False, f"Szerokość poniżej minimum ({wmin}mm)"
+        return False, f"Szerokość powyżej maksimum ({wmax}mm)"
 
     def calculate_price(
         self,
@@ -255,6 +381,7 @@ class PricingService:
         grinding_grit: Optional[str] = None,
         grinding_width_variant: Optional[str] = None,
         with_sb: bool = False,
+        base_price_cache: Optional[dict[tuple, BasePrice]] = None,
     ) -> PriceBreakdown:
         """Oblicz pełną cenę z wszystkimi modyfikatorami.
 
@@ -269,48 +396,58 @@ class PricingService:
             grinding_grit: granulacja szlifu
             grinding_width_variant: wariant szerokości dla BORYS
             with_sb: czy z zabezpieczeniem SB
+            base_price_cache: ceny z preload_price_matrix (zamiast zapytania)
 
         Returns:
             PriceBreakdown z rozbiciem ceny
         """
-        # Pobierz materiał
-        material = self.db.query(Material).filter(Material.id == material_id).first()
-        if not material:
-            raise ValueError(f"Nie znaleziono materiału o ID {material_id}")
+        # Dostawca i folia mogą przyjść jako tekst - zamiana na enum raz, na wejściu
+        if isinstance(grinding_provider, str):
+            grinding_provider = GrindingProvider(grinding_provider)
+        if isinstance(film_type, str):
+            film_type = FilmType(film_type)
+
+        # Cena bazowa razem z materiałem - jedno zapytanie albo wczytana macierz
+        if base_price_cache is not None:
+            base_price = base_price_cache.get((material_id, surface_finish, thickness, width))
+        else:
+            base_price = self.get_base_price(material_id, surface_finish, thickness, width)
+
+        if not base_price:
+            # Brak ceny - rozróżnij brak materiału od braku ceny
+            material = self.db.query(Material).filter(Material.id == material_id).first()
+            if not material:
+                raise ValueError(f"Nie znaleziono materiału o ID {material_id}")
+            raise ValueError(
+                f"Nie znaleziono ceny bazowej dla: {material.grade} {surface_finish} "
+                f"{thickness}mm x {width}mm"
+            )
+
+        material = base_price.material
 
-        # Inicjalizuj wynik
+        # Inicjalizuj wynik z ceną bazową i wymiarami
         breakdown = PriceBreakdown(
-            base_price=0.0,
+            base_price=base_price.price_pln_per_kg,
             thickness=thickness,
             width=width,
             length=length,
+            weight_kg=self.calculate_weight(thickness, width, length, material.density),
+            area_m2=self.calculate_area(width, length),
             material_grade=material.grade,
             surface_finish=surface_finish,
             exchange_rate=self.exchange_rate,
+            notes=base_price.notes,
         )
 
-        # Oblicz wymiary
-        breakdown.weight_kg = self.calculate_weight(
-            thickness, width, length, material.density
-        )
-        breakdown.area_m2 = self.calculate_area(width, length)
-
-        # Pobierz cenę bazową
-        base_price = self.get_base_price(material_id, surface_finish, thickness, width)
-        if not base_price:
-            raise ValueError(
-                f"Nie znaleziono ceny bazowej dla: {material.grade} {surface_finish} "
-                f"{thickness}mm x {width}mm"
-            )
-
-        breakdown.base_price = base_price.price_pln_per_kg
-        breakdown.notes = base_price.notes
+        # Sama cena bazowa (najczęstszy przypadek) - bez folii i szlifu
+        if not film_type and not grinding_provider:
+            breakdown.calculate_totals()
+            return breakdown
 
         # Sprawdź czy obróbka dozwolona
         if grinding_provider:
             allowed, notes = self.check_processing_allowed(
-                material.grade, surface_finish, thickness, width,
-                grinding_provider.value if isinstance(grinding_provider, GrindingProvider) else grinding_provider
+                material.grade, surface_finish, thickness, width, grinding_provider.value
             )
             if not allowed:
                 breakdown.notes = notes
@@ -350,8 +487,44 @@ class PricingService:
         width: Optional[float] = None,
     ) -> list[dict]:
         """Pobierz tabelę cennikową z filtrami."""
+        return list(self.iter_price_table(
+            category=category,
+            grade=grade,
+            surface_finish=surface_finish,
+            thickness_min=thickness_min,
+            thickness_max=thickness_max,
+            width=width,
+        ))
+
+    def iter_price_table(
+        self,
+        category: Optional[MaterialCategory] = None,
+        grade: Optional[str] = None,
+        surface_finish: Optional[str] = None,
+        thickness_min: Optional[float] = None,
+        thickness_max: Optional[float] = None,
+        width: Optional[float] = None,
+    ) -> Iterator[dict]:
+        """Wiersze tabeli cennikowej strumieniowo, po PRICE_TABLE_YIELD_PER z bazy.
+
+        Dla dużych katalogów - w pamięci jest jedna paczka wierszy, a nie
+        cała tabela.
+        """
+        # Tylko potrzebne kolumny jako krotki - bez obiektów ORM
         query = (
-            self.db.query(BasePrice, Material)
+            self.db.query(
+                BasePrice.id,
+                Material.id,
+                Material.name,
+                Material.grade,
+                Material.category,
+                BasePrice.surface_finish,
+                BasePrice.thickness,
+                BasePrice.width,
+                BasePrice.length,
+                BasePrice.price_pln_per_kg,
+                BasePrice.notes,
+            )
             .join(Material, BasePrice.material_id == Material.id)
             .filter(BasePrice.is_active == True)
         )
@@ -369,26 +542,17 @@ class PricingService:
         if width:
             query = query.filter(BasePrice.width == width)
 
-        results = []
-        for price, material in query.all():
-            results.append({
-                "id": price.id,
-                "material_id": material.id,
-                "material_name": material.name,
-                "grade": material.grade,
-                "category": material.category.value,
-                "surface_finish": price.surface_finish,
-                "thickness": price.thickness,
-                "width": price.width,
-                "length": price.length,
-                "price_pln_per_kg": price.price_pln_per_kg,
-                "price_eur_per_kg": round(
-                    price.price_pln_per_kg / self.exchange_rate, 4
-                ),
-                "notes": price.notes,
-            })
-
-        return results
+        # Odwrotność kursu liczona raz - w wierszach mnożenie zamiast dzielenia
+        inv_rate = 1 / self.exchange_rate
+        keys = _PRICE_TABLE_KEYS
+        for (
+            price_id, material_id, name, grade, category, surface,
+            thickness, width, length, price_pln, notes,
+        ) in query.yield_per(PRICE_TABLE_YIELD_PER):
+            yield dict(zip(keys, (
+                price_id, material_id, name, grade, category.value, surface,
+                thickness, width, length, price_pln, round(price_pln * inv_rate, 4), notes,
+            )))
 
     def get_available_options(
         self, material_id: int, surface_finish: str, thickness: float
@@ -403,9 +567,9 @@ class PricingService:
             material.grade, surface_finish, thickness, 1000
         )
 
-        # Pobierz dostępne folie
+        # Pobierz dostępne folie (tylko potrzebne kolumny)
         films = (
-            self.db.query(FilmPrice)
+            self.db.query(FilmPrice.film_type, FilmPrice.price_pln_per_kg)
             .filter(
                 FilmPrice.thickness == thickness,
                 FilmPrice.is_active == True,
@@ -415,7 +579,13 @@ class PricingService:
 
         # Pobierz dostępne szlify
         grindings = (
-            self.db.query(GrindingPrice)
+            self.db.query(
+                GrindingPrice.provider,
+                GrindingPrice.grit,
+                GrindingPrice.width_variant,
+                GrindingPrice.with_sb,
+                GrindingPrice.price_pln_per_kg,
+            )
             .filter(
                 GrindingPrice.thickness == thickness,
                 GrindingPrice.is_active == True,
@@ -427,20 +597,17 @@ class PricingService:
             "processing_allowed": allowed,
             "notes": notes,
             "films": [
-                {
-                    "type": f.film_type.value,
-                    "price_pln_kg": f.price_pln_per_kg,
-                }
-                for f in films
+                {"type": film_type.value, "price_pln_kg": price}
+                for film_type, price in films
             ],
             "grindings": [
                 {
-                    "provider": g.provider.value,
-                    "grit": g.grit,
-                    "width_variant": g.width_variant,
-                    "with_sb": g.with_sb,
-                    "price_pln_kg": g.price_pln_per_kg,
+                    "provider": provider.value,
+                    "grit": grit,
+                    "width_variant": width_variant,
+                    "with_sb": with_sb,
+                    "price_pln_kg": price,
                 }
-                for g in grindings
+                for provider, grit, width_variant, with_sb, price in grindings
             ],
         }
@@ -0,0 +1,26 @@
+"""Wspólne fixtures testów."""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database import Base
+import src.models  # noqa: F401 - rejestracja modeli w Base.metadata
+
+
+@pytest.fixture
+def db():
+    """Sesja na świeżej bazie SQLite w pamięci."""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
@@ -0,0 +1,58 @@
+"""Testy zbiorczych zmian cen."""
+
+import pytest
+
+from src.models import BasePrice, Material, MaterialCategory
+from src.services.bulk_pricing import BulkPricingService
+
+
+@pytest.mark.parametrize(
+    "current, change_type, change_value, expected",
+    [
+        (2.675, "absolute", 0, 2.68),
+        (10.125, "absolute", 0, 10.13),
+        (1.005, "absolute", 0, 1.01),
+        (10.0, "percentage", 1.25, 10.13),
+        (5.0, "absolute", -7.5, 0.0),
+    ],
+)
+def test_calculate_new_price_rounds_half_up(current, change_type, change_value, expected):
+    """Połówka zaokrąglana w górę na wartości dziesiętnej, nie binarnej."""
+    service = BulkPricingService(None)
+    assert service.calculate_new_price(current, change_type, change_value) == expected
+
+
+@pytest.mark.parametrize(
+    "change_type, change_value",
+    [("absolute", 0), ("absolute", 0.005), ("percentage", 1.25), ("percentage", -33.3)],
+)
+def test_new_price_expression_matches_calculate_new_price(db, change_type, change_value):
+    """Ceny zapisywane przez apply_changes (SQL) zgodne z calculate_new_price."""
+    material = Material(
+        name="Stal nierdzewna 304",
+        grade="1.4301",
+        category=MaterialCategory.STAINLESS_STEEL,
+        density=7.9,
+    )
+    db.add(material)
+    db.flush()
+    prices = [2.675, 10.125, 1.005, 0.125, 7.3, 19.995, 123.456]
+    for width, price in enumerate(prices, start=1000):
+        db.add(BasePrice(
+            material_id=material.id,
+            surface_finish="2B",
+            thickness=1.0,
+            width=width,
+            length=2000,
+            price_pln_per_kg=price,
+        ))
+    db.flush()
+
+    service = BulkPricingService(db)
+    expr = service.new_price_expression(change_type, change_value)
+    rows = db.query(BasePrice.price_pln_per_kg, expr).order_by(BasePrice.id).all()
+
+    assert [new for _, new in rows] == [
+        service.calculate_new_price(current, change_type, change_value)
+        for current, _ in rows
+    ]
@@ -0,0 +1,64 @@
+"""Testy importu cennika z Excela."""
+
+import openpyxl
+
+from src.models import BasePrice, FilmPrice
+from src.services import excel_import
+from src.services.excel_import import BASE_PRICE_COLUMNS, ExcelImporter
+
+
+def _workbook(base_rows, film_rows=None):
+    """Skoroszyt z arkuszem 'cennik baza' (i opcjonalnie 'DANE FOLIA')."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "cennik baza"
+    ws.append(BASE_PRICE_COLUMNS)
+    for row in base_rows:
+        ws.append(row)
+    if film_rows is not None:
+        film = wb.create_sheet("DANE FOLIA")
+        film.append(["grubość", "Novacel 4228"])
+        for row in film_rows:
+            film.append(row)
+    return wb
+
+
+def test_base_price_sheet_failing_in_later_chunk_is_rolled_back(db, monkeypatch):
+    """Błąd w dalszej paczce wycofuje cały arkusz, kolejne arkusze są importowane."""
+    monkeypatch.setattr(excel_import, "BATCH_SIZE", 10)
+    rows = [
+        [i, "1.4301", "2B", 1.0, 1000 + i, 2000, 20.0]
+        for i in range(1, 36)
+    ]
+    rows[24][4] = None  # pusta szerokość w trzeciej paczce
+
+    result = ExcelImporter(db).import_workbook(
+        _workbook(rows, film_rows=[[0.5, 1.25]])
+    )
+
+    assert result.success is False
+    assert [e["sheet"] for e in result.errors] == ["cennik baza"]
+    assert result.base_prices_imported == 0
+    assert result.materials_imported == 0
+    assert db.query(BasePrice).count() == 0
+
+    assert result.film_prices_imported == 1
+    assert db.query(FilmPrice).count() == 1
+
+
+def test_base_prices_imported_counts_inserted_rows(db, monkeypatch):
+    """Licznik obejmuje wstawione wiersze, duplikaty w pliku liczone raz."""
+    monkeypatch.setattr(excel_import, "BATCH_SIZE", 10)
+    rows = [
+        [i, "1.4301", "2B", 1.0, 1000 + i, 2000, 20.0]
+        for i in range(1, 26)
+    ]
+    rows.append([26, "1.4301", "2B", 1.0, 1001, 2000, 21.0])
+
+    result = ExcelImporter(db).import_workbook(_workbook(rows))
+
+    assert result.success is True
+    assert result.base_prices_imported == 25
+    assert db.query(BasePrice).count() == 25
+    price = db.query(BasePrice).filter(BasePrice.width == 1001).one()
+    assert price.price_pln_per_kg == 21.0